@@ -3,22 +3,40 @@ Title: API Entry Point
 Author: Trojan
 Date: 25-06-2024
 """
+import json
 import logging
 import os
-import re
-from typing import List, Optional
+import threading
+import time
+from functools import partial, wraps
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, make_response
 from pix2text import Pix2Text
 from py_asciimath.translator.translator import Tex2ASCIIMath
 from flask_cors import CORS
 
-from utilities.config import LOGGING_LEVEL, API_VERSION, DOWNLOADED_IMAGE_PATH
-from utilities.core_utils import generate_request_id, parse_request_data, convert_to_ascii, advanced_text_extraction, \
-    TEXT, LATEX, construct_response, validate_file, save_file, extract_data_from_image, \
-    extract_image_size, parse_form_data
+from data_extractors.script_classifier import load_script_classifier
+from utilities.admission import AdmissionController, OverloadedError
+from utilities.batch_processor import BatchProcessor, parse_batch_items
+from utilities.classifier_registry import CLASSIFIER_REGISTRY
+from utilities.config import LOGGING_LEVEL, API_VERSION, DOWNLOADED_IMAGE_PATH, LANGUAGE_CODES, \
+    PRELOADED_LANGUAGES, MAX_RESIDENT_MODELS, MODEL_MEMORY_BUDGET_MB, SHARE_FORMULA_MODELS, MODEL_DEVICE, \
+    SCRIPT_ROUTING_ENABLED, RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_ENTRIES, \
+    RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_SQLITE_PATH, RESULT_CACHE_SQLITE_MAX_ENTRIES, SINGLE_FLIGHT_ENABLED, \
+    ADMISSION_CONTROL_ENABLED, ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUED, ADMISSION_QUEUE_TIMEOUT_SECONDS, \
+    ADMISSION_RETRY_AFTER_SECONDS, MODEL_MAX_CONCURRENCY, MODEL_DEFAULT_MAX_CONCURRENCY, AUTO_MODE_MAX_CONCURRENT, \
+    HANDWRITING_CLASSIFIER_MODEL_PATH
+from utilities.core_utils import generate_request_id, parse_request_data, validate_file, read_file, parse_form_data, \
+    process_image, process_url, is_streaming_requested
 from utilities.custom_exception import CustomExceptionAndLog
-from utilities.general_utils import assign_values_from_request, check_url_and_download_image, setup_logging
+from utilities.general_utils import setup_logging
+from utilities import metrics
+from utilities.model_factory import SharedPix2TextFactory, enable_formula_batching, text_formula_configs
+from utilities.model_registry import ModelRegistry
+from utilities.profiling import profile_request, requested_profile
+from utilities.request_context import RequestContext, RequestOptions
+from utilities.result_cache import ResultCache
+from utilities.single_flight import SingleFlight
 
 # Logging Configuration
 setup_logging(LOGGING_LEVEL)
@@ -28,88 +46,133 @@ class MyFlaskApp(Flask):
         super().__init__(import_name)
         self.api_version = API_VERSION
 
-        # Initialize Pix2Text models for different languages
-        self.latex_model_english = Pix2Text().from_config(total_configs={'text_formula': {'languages': ('en',)}})
-        self.latex_model_korean = self._initialize_latex_model('ko')
-        self.latex_model_japanese = self._initialize_latex_model('ja')
-        self.latex_model_chinese_sim = self._initialize_latex_model('ch_sim')
-        self.latex_model_chinese_tra = self._initialize_latex_model('ch_tra')
+        # Pix2Text models for different languages, loaded on first use
+        if SHARE_FORMULA_MODELS:
+            self.model_factory = SharedPix2TextFactory(device=MODEL_DEVICE)
+            self.model_factory.load_shared_models()
+            model_loader = self.model_factory.build
+        else:
+            self.model_factory = None
+            model_loader = self._initialize_latex_model
+
+        self.model_registry = ModelRegistry(
+            loaders={language: partial(model_loader, language_code)
+                     for language, language_code in LANGUAGE_CODES.items()},
+            max_resident=MAX_RESIDENT_MODELS,
+            memory_budget_mb=MODEL_MEMORY_BUDGET_MB,
+            max_concurrency=MODEL_MAX_CONCURRENCY,
+            default_max_concurrency=MODEL_DEFAULT_MAX_CONCURRENCY
+        )
+        self.model_registry.preload(PRELOADED_LANGUAGES)
 
         logging.info("Math OCR Models Initialized!!!")
 
+        # Handwriting classifier, loaded once and shared by every request
+        self.classifier_registry = CLASSIFIER_REGISTRY
+        self.classifier_registry.preload(HANDWRITING_CLASSIFIER_MODEL_PATH)
+
+        # Script classifier routing auto mode requests
+        self.script_classifier = load_script_classifier() if SCRIPT_ROUTING_ENABLED else None
+
         # Initialize AsciiMath OCR models
         self.tex2asciimath = Tex2ASCIIMath(log=False, inplace=True)
         logging.info("AsciiMath OCR Models Initialized!!!")
 
-        # Downloaded image path and image properties
+        # Downloaded image path
         self.downloaded_file_path = os.path.join(DOWNLOADED_IMAGE_PATH)
-        self.image_width = None
-        self.image_height = None
-
-        # Image Source & Language
-        self.image_url: Optional[str] = ""
-        self.language: str = ""
-
-        # Advanced Text Extraction
-        self.advanced_text_extraction = False
-
-        # Language Comparison Dictionary
-        self.language_dictionary = {
-            "CHINESE_SIM": self.latex_model_chinese_sim,
-            "CHINESE_TRA": self.latex_model_chinese_tra,
-            "KOREAN": self.latex_model_korean,
-            "JAPANESE": self.latex_model_japanese,
-            "ENGLISH": self.latex_model_english
-        }
 
-        # Formats and data options initialization
-        self.formats: List[str] = []
-        self.data_options = {}
-        self.include_svg: bool = False
-        self.include_table_html: bool = False
-        self.include_latex: bool = False
-        self.include_tsv: bool = False
-        self.include_asciimath: bool = False
-        self.include_mathml: bool = False
-        self.include_text: bool = False
-
-        # Format and Text Options initialization
-        self.format_options = {}
-        self.text_format_options: dict = {}
-        self.text_math_delims: List[str] = []
-        self.text_displaymath_delims: List[str] = []
-        self.text_transforms: dict = {}
-
-        # Text Transforms initialization
-        self.text_rm_spaces: bool = False
-        self.text_rm_newlines: bool = False
-        self.text_rm_fonts: bool = False
-        self.text_rm_style_syms: bool = False
-        self.text_rm_text: bool = False
-        self.text_long_frac: bool = False
-
-        # Data Format and Transforms initialization
-        self.data_format_options: dict = {}
-        self.data_math_delims: List[str] = []
-        self.data_displaymath_delims: List[str] = []
-        self.data_transforms: dict = {}
-
-        # Data Transforms initialization
-        self.data_rm_spaces: bool = False
-        self.data_rm_newlines: bool = False
-        self.data_rm_fonts: bool = False
-        self.data_rm_style_syms: bool = False
-        self.data_rm_text: bool = False
-        self.data_long_frac: bool = False
+        # Result cache
+        self.result_cache = ResultCache(
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+            sqlite_path=RESULT_CACHE_SQLITE_PATH,
+            sqlite_max_entries=RESULT_CACHE_SQLITE_MAX_ENTRIES
+        ) if RESULT_CACHE_ENABLED else None
+
+        # De-duplication of identical in-flight requests
+        self.single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+        # Download, decode and inference pipeline of batch requests
+        self.batch_processor = BatchProcessor(self)
+
+        # Admission control of the conversion requests and limit of the concurrent auto mode requests
+        self.admission = AdmissionController(
+            max_concurrent=ADMISSION_MAX_CONCURRENT,
+            max_queued=ADMISSION_MAX_QUEUED,
+            queue_timeout_seconds=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS
+        ) if ADMISSION_CONTROL_ENABLED else None
+        self.auto_mode_slots = threading.BoundedSemaphore(AUTO_MODE_MAX_CONCURRENT) \
+            if AUTO_MODE_MAX_CONCURRENT else None
+
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Expose the statistics of the registry, the caches and the single flight on /metrics."""
+        metrics.REGISTRY.register(metrics.Gauge(
+            "formula_ocr_resident_models", "Language models loaded in memory.",
+            function=lambda: len(self.model_registry.resident_languages())
+        ))
+        metrics.REGISTRY.register(metrics.Counter(
+            "formula_ocr_model_registry_events_total", "Model registry hits, loads and evictions.", ("event",),
+            function=lambda: [((event,), count) for event, count in self.model_registry.stats.items()]
+        ))
+        metrics.REGISTRY.register(metrics.Gauge(
+            "formula_ocr_classifier_load_seconds", "Load time of the classifiers, by model file.", ("model_path",),
+            function=lambda: [((model_path,), seconds)
+                              for model_path, seconds in self.classifier_registry.load_seconds().items()]
+        ))
+        metrics.REGISTRY.register(metrics.Counter(
+            "formula_ocr_classifier_registry_events_total", "Classifier registry hits, loads and reloads.", ("event",),
+            function=lambda: [((event,), count) for event, count in self.classifier_registry.stats.items()]
+        ))
+        if self.result_cache is not None:
+            metrics.REGISTRY.register(metrics.Counter(
+                "formula_ocr_result_cache_events_total", "Result cache lookups and stores by outcome.", ("event",),
+                function=lambda: [((event,), count) for event, count in self.result_cache.stats.items()]
+            ))
+            metrics.REGISTRY.register(metrics.Gauge(
+                "formula_ocr_result_cache_hit_ratio", "Share of the result cache lookups answered by the cache.",
+                function=self.result_cache.hit_rate
+            ))
+        metrics.REGISTRY.register(metrics.Gauge(
+            "formula_ocr_model_slots_in_use", "Concurrent calls of each language model.", ("language",),
+            function=lambda: [((language,), count) for language, count in self.model_registry.slots_in_use.items()]
+        ))
+        if self.admission is not None:
+            metrics.REGISTRY.register(metrics.Gauge(
+                "formula_ocr_admission_running", "Requests holding a processing slot.",
+                function=lambda: self.admission.running
+            ))
+            metrics.REGISTRY.register(metrics.Gauge(
+                "formula_ocr_admission_queued", "Requests waiting for a processing slot.",
+                function=lambda: self.admission.queued
+            ))
+            metrics.REGISTRY.register(metrics.Counter(
+                "formula_ocr_admission_events_total", "Requests admitted, queued, rejected or timed out.", ("event",),
+                function=lambda: [((event,), count) for event, count in self.admission.stats.items()]
+            ))
+        if self.single_flight is not None:
+            metrics.REGISTRY.register(metrics.Gauge(
+                "formula_ocr_single_flight_in_flight", "Distinct computations shared by identical requests.",
+                function=lambda: self.single_flight.in_flight
+            ))
+            metrics.REGISTRY.register(metrics.Counter(
+                "formula_ocr_single_flight_calls_total", "Calls executed or shared with an identical one.",
+                ("outcome",),
+                function=lambda: [((outcome,), count) for outcome, count in self.single_flight.stats.items()]
+            ))
 
     @staticmethod
-    def _initialize_latex_model(language_code: str) -> Pix2Text:
+    def _initialize_latex_model(language_code: tuple) -> Pix2Text:
         """Helper function to initialize Pix2Text model based on language code."""
         config = {
-            'text_formula': {'languages': ('en', language_code)},
+            'text_formula': text_formula_configs(language_code),
         }
-        return Pix2Text.from_config(total_configs=config, device="cuda")  # In-case of gpu support
-        # return Pix2Text.from_config(total_configs=config) # In-case of no gpu support
+        if language_code == ('en',):  # English model keeps Pix2Text's default device
+            return enable_formula_batching(Pix2Text.from_config(total_configs=config))
+        return enable_formula_batching(Pix2Text.from_config(total_configs=config, device="cuda"))  # In-case of gpu support
+        # return enable_formula_batching(Pix2Text.from_config(total_configs=config)) # In-case of no gpu support
 
 
 
@@ -119,51 +182,116 @@ app = MyFlaskApp(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 
-@app.route('/convert_text', methods=['POST'])
-def convert_text():
-    try:
-        request_id = generate_request_id()
-        logging.info(f"REQUEST_ID: {request_id}#################")
-
-        request_data = parse_request_data(request)
-        assign_values_from_request(request_data, app=app)
-
-        downloaded_file_path = check_url_and_download_image(image_url=app.image_url, request_id=request_id, app=app)
-        if isinstance(downloaded_file_path, dict):
-            return downloaded_file_path
+def endpoint_label():
+    """Route of the request, so that unknown paths don't create a metric each."""
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_start_time = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=endpoint_label())
+
+
+@app.after_request
+def record_request_metrics(response):
+    if "request_start_time" in g:
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - g.request_start_time, endpoint=endpoint_label())
+        metrics.REQUESTS.inc(endpoint=endpoint_label(), status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def end_request_metrics(error=None):
+    if "request_start_time" in g:
+        metrics.REQUESTS_IN_FLIGHT.dec(endpoint=endpoint_label())
+
+
+def profiled(route):
+    """
+    Run the route under the profiler requested by the X-Profile header or the profile query parameter (if
+    allowed by the configuration). The profiles are stored under the request_id, returned in X-Profile-Id.
+    """
+    @wraps(route)
+    def wrapper(*args, **kwargs):
+        settings = requested_profile(request.headers, request.args)
+        if settings is None:
+            return route(*args, **kwargs)
+
+        with profile_request(settings) as profile:
+            # Only a request actually profiled bypasses the result cache and the single flight
+            if profile.active:
+                g.profile = profile
+            response = make_response(route(*args, **kwargs))
+        if profile.paths:
+            response.headers["X-Profile-Id"] = profile.request_id
+        return response
+    return wrapper
+
+
+def admitted(route):
+    """
+    Run the route once the admission controller gives it a processing slot, or answer at once with HTTP 503 and
+    Retry-After when the server is overloaded. A streamed response keeps its slot until it is fully sent.
+    """
+    @wraps(route)
+    def wrapper(*args, **kwargs):
+        if app.admission is None:
+            return route(*args, **kwargs)
+
+        try:
+            app.admission.acquire()
+        except OverloadedError as e:
+            response = jsonify({
+                "status": 0,
+                "request_id": generate_request_id(),
+                "version": app.api_version,
+                "error": e.error_dict
+            })
+            response.status_code = 503
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response
+
+        try:
+            response = make_response(route(*args, **kwargs))
+        except Exception:
+            app.admission.release()
+            raise
+        if response.is_streamed:
+            response.call_on_close(app.admission.release)
+        else:
+            app.admission.release()
+        return response
+    return wrapper
 
-        app.image_width, app.image_height = extract_image_size(downloaded_file_path)
 
-        (latex_styled_result, latex_confidence, is_handwritten,
-         is_diagram_available, confidence_per_line) = extract_data_from_image(downloaded_file_path, app, request_id)
+def new_request_context():
+    """Create the context of a new request, registering its request_id with the profiler if it is profiled."""
+    request_id = generate_request_id()
+    profile = g.get("profile")
+    if profile is not None:
+        profile.request_id = request_id
+    return RequestContext(request_id, profiling=profile is not None)
 
-        data_ascii_result, text_result = convert_to_ascii(latex_styled_result, app, request_id)
 
-        advanced_text_result = advanced_text_extraction(app, downloaded_file_path, request_id)
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
-        if advanced_text_result is not None:
-            if len(advanced_text_result) <= len(text_result) // 2:
-                advanced_text_result = text_result
-        else:
-            advanced_text_result = ""
 
-        if not text_result.strip():
-            text_result = "".join([item["value"] for item in data_ascii_result if item["type"] == "asciimath"])
+@app.route('/convert_text', methods=['POST'])
+@admitted
+@profiled
+def convert_text():
+    try:
+        context = new_request_context()
+        request_id = context.request_id
+        logging.info(f"REQUEST_ID: {request_id}#################")
 
-        latex_styled_result = re.sub(r'\\{2,}', r'\\', latex_styled_result)
+        request_data = parse_request_data(request)
+        context = context.with_options(RequestOptions.from_request_data(request_data))
 
-        final_data_result = []
-        if app.include_text:
-            final_data_result.append({"type": TEXT, "value": text_result})
-        if app.include_asciimath:
-            final_data_result += data_ascii_result
-        if app.include_latex:
-            final_data_result.append({"type": LATEX, "value": latex_styled_result})
-
-        return construct_response(
-            app, request_id, text_result, advanced_text_result, latex_styled_result, final_data_result,
-            is_handwritten, is_diagram_available, latex_confidence, confidence_per_line
-        )
+        return jsonify(process_url(app, context))
 
     except Exception as e:
         if isinstance(e, CustomExceptionAndLog):
@@ -171,21 +299,26 @@ def convert_text():
         else:
             error_dict = {"code": "E_OCR_006", "message": str(e)}
             logging.error(error_dict)
+        # Failures after the download carry the context holding the image size
+        sized_context = getattr(e, "context", context)
         response_dict = {
             "status": 0,
             "request_id": request_id,
             "version": app.api_version,
-            "image_width": app.image_width,
-            "image_height": app.image_height,
+            "image_width": sized_context.image_width,
+            "image_height": sized_context.image_height,
             "error": error_dict,
-            "url": app.image_url
+            "url": context.options.image_url
         }
         return jsonify(response_dict)
 
 @app.route('/convert_text_multipart', methods=['POST'])
+@admitted
+@profiled
 def convert_text_multipart():
     try:
-        request_id = generate_request_id()
+        context = new_request_context()
+        request_id = context.request_id
 
         valid, error = validate_file(request, request_id)
         if not valid:
@@ -197,56 +330,66 @@ def convert_text_multipart():
             })
 
         file = request.files['file']
-        file_path = save_file(file, request_id, app)
+        image_context = read_file(file, request_id, app)
 
-        app.image_width, app.image_height = extract_image_size(file_path)
+        context = context.with_image_size(image_context.size)
 
         request_data = parse_form_data(request)
-        assign_values_from_request(request_data, app=app)
+        context = context.with_options(RequestOptions.from_request_data(request_data))
 
-        (latex_styled_result, latex_confidence, is_handwritten,
-         is_diagram_available, confidence_per_line) = extract_data_from_image(file_path, app, request_id)
+        return jsonify(process_image(image_context, app, context))
 
-        data_ascii_result, text_result = convert_to_ascii(latex_styled_result, app, request_id)
+    except Exception as e:
+        if isinstance(e, CustomExceptionAndLog):
+            error_dict = e.error_dict
+        else:
+            error_dict = {"code": "E_OCR_009", "message": str(e)}
+            logging.error(error_dict)
+        return jsonify({
+            "status": 0,
+            "request_id": request_id,
+            "version": app.api_version,
+            "image_width": context.image_width,
+            "image_height": context.image_height,
+            "error": error_dict
+        })
 
-        advanced_extracted_text = advanced_text_extraction(app, file_path, request_id)
 
-        if advanced_extracted_text is not None:
-            if len(advanced_extracted_text) <= len(text_result) // 2:
-                advanced_extracted_text = text_result
-        else:
-            advanced_extracted_text = ""
+# Not admitted as a whole: the batch processor takes an admission slot for each image it recognizes
+@app.route('/convert_text_batch', methods=['POST'])
+def convert_text_batch():
+    try:
+        request_id = generate_request_id()
+        logging.info(f"BATCH REQUEST_ID: {request_id}#################")
 
-        if not text_result.strip():
-            text_result = "".join([item["value"] for item in data_ascii_result if item["type"] == "asciimath"])
+        items = parse_batch_items(request, app)
+        logging.info(f"BATCH REQUEST_ID: {request_id} items: {[item.context.request_id for item in items]}")
 
-        latex_styled_result = re.sub(r'\\{2,}', r'\\', latex_styled_result)
+        if is_streaming_requested(request):
+            def generate_lines():
+                for item, response_dict in app.batch_processor.iter_completed(items):
+                    yield json.dumps(dict(response_dict, index=item.index)) + "\n"
 
-        final_data_result = []
-        if app.include_text:
-            final_data_result.append({"type": TEXT, "value": text_result})
-        if app.include_asciimath:
-            final_data_result += data_ascii_result
-        if app.include_latex:
-            final_data_result.append({"type": LATEX, "value": latex_styled_result})
+            return Response(generate_lines(), mimetype="application/x-ndjson",
+                            headers={"X-Request-Id": request_id})
 
-        return construct_response(
-            app, request_id, text_result, advanced_extracted_text, latex_styled_result, final_data_result,
-            is_handwritten, is_diagram_available, latex_confidence, confidence_per_line
-        )
+        return jsonify({
+            "status": 1,
+            "request_id": request_id,
+            "version": app.api_version,
+            "results": app.batch_processor.process(items)
+        })
 
     except Exception as e:
         if isinstance(e, CustomExceptionAndLog):
             error_dict = e.error_dict
         else:
-            error_dict = {"code": "E_OCR_009", "message": str(e)}
+            error_dict = {"code": "E_OCR_025", "message": str(e)}
             logging.error(error_dict)
         return jsonify({
             "status": 0,
             "request_id": request_id,
             "version": app.api_version,
-            "image_width": app.image_width,
-            "image_height": app.image_height,
             "error": error_dict
         })
 
@@ -0,0 +1,344 @@
+"""
+Title: Async API Entry Point
+Author: Trojan
+Date: 17-10-2026
+"""
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from itertools import islice
+
+from aiohttp import BodyPartReader, web
+
+from app import app as flask_app
+from utilities.admission import AsyncAdmissionController, OverloadedError
+from utilities.async_http_client import create_session, download_image_bytes
+from utilities.config import LOGGING_LEVEL, BATCH_MAX_ITEMS, BATCH_STREAM_WINDOW, DOWNLOAD_MAX_BYTES, \
+    DOWNLOAD_CHUNK_SIZE, ASYNC_DECODE_WORKERS, ASYNC_INFERENCE_WORKERS, ADMISSION_CONTROL_ENABLED, \
+    ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUED, ADMISSION_QUEUE_TIMEOUT_SECONDS, ADMISSION_RETRY_AFTER_SECONDS
+from utilities.core_utils import generate_request_id, process_image, url_flight_key, with_request_fields
+from utilities.custom_exception import CustomExceptionAndLog
+from utilities.general_utils import save_image_bytes, setup_logging
+from utilities.image_context import ImageContext
+from utilities.request_context import RequestContext, RequestOptions
+from utilities import metrics
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+# Models, caches and configuration are shared with the Flask app; the CPU-bound stages run on bounded pools
+decode_executor = ThreadPoolExecutor(max_workers=ASYNC_DECODE_WORKERS, thread_name_prefix="async-decode")
+inference_executor = ThreadPoolExecutor(max_workers=ASYNC_INFERENCE_WORKERS, thread_name_prefix="async-inference")
+
+routes = web.RouteTableDef()
+
+# Admission control of the conversion routes, with the same limits as the Flask app
+admission = AsyncAdmissionController(
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    max_queued=ADMISSION_MAX_QUEUED,
+    queue_timeout_seconds=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS
+) if ADMISSION_CONTROL_ENABLED else None
+# The batch route takes a slot for each of its images instead (see admitted_item)
+ADMITTED_PATHS = ('/convert_text', '/convert_text_multipart')
+
+
+async def convert_image_bytes(image_bytes: bytes, context: RequestContext) -> dict:
+    """Decode the image and run the pipeline on the executors, returning the response dictionary."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(decode_executor, save_image_bytes, image_bytes, context.request_id, flask_app)
+    image_context = await loop.run_in_executor(decode_executor, ImageContext, image_bytes)
+    context = context.with_image_size(image_context.size)
+    try:
+        return await loop.run_in_executor(inference_executor, process_image, image_context, flask_app, context)
+    except Exception as e:
+        # Keep the image size in the error response, like the Flask routes do
+        e.context = context
+        raise
+
+
+async def convert_image_url(session, context: RequestContext) -> dict:
+    """
+    Download the image of the request without blocking the event loop, then convert it.
+
+    Identical requests (same URL and options) in flight at the same time, on these routes or on the Flask ones,
+    share a single download and pipeline run, as in process_url.
+    """
+    async def download_and_convert():
+        image_bytes = await download_image_bytes(session, context.options.image_url)
+        return await convert_image_bytes(image_bytes, context)
+
+    if flask_app.single_flight is None:
+        return await download_and_convert()
+
+    response_dict, shared = await flask_app.single_flight.do_async(url_flight_key(context), download_and_convert)
+    if shared:
+        logging.info(f"Sharing the response of an identical in-flight request for REQUEST_ID: {context.request_id}")
+        return with_request_fields(response_dict, context)
+    return response_dict
+
+
+def error_response(context: RequestContext, error: Exception, error_code: str, include_url: bool) -> dict:
+    """Build the error response of a request, as the Flask routes do."""
+    if isinstance(error, CustomExceptionAndLog):
+        error_dict = error.error_dict
+    else:
+        error_dict = {"code": error_code, "message": str(error)}
+    logging.error(error_dict)
+    # The image size is known by the context of the call which failed, which may be an identical request's
+    sized_context = getattr(error, "context", context)
+    response_dict = {
+        "status": 0,
+        "request_id": context.request_id,
+        "version": flask_app.api_version,
+        "image_width": sized_context.image_width,
+        "image_height": sized_context.image_height,
+        "error": error_dict
+    }
+    if include_url:
+        response_dict["url"] = context.options.image_url
+    return response_dict
+
+
+async def read_part(part: BodyPartReader, max_bytes: int = DOWNLOAD_MAX_BYTES) -> bytes:
+    """Read a part of a multipart body chunk by chunk, stopping as soon as it exceeds max_bytes."""
+    buffer = bytearray()
+    while True:
+        chunk = await part.read_chunk(DOWNLOAD_CHUNK_SIZE)
+        if not chunk:
+            return bytes(buffer)
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise CustomExceptionAndLog("E_OCR_021", f"Image exceeds the maximum size of {max_bytes} bytes")
+
+
+async def parse_form_data(request: web.Request, max_files: int = 1):
+    """
+    Stream the multipart form: the options (as parse_form_data in core_utils) and the content of the first max_files
+    uploaded files, every part being limited to DOWNLOAD_MAX_BYTES. The other files are skipped unread.
+
+    :return: The request data, the files and the number of file parts in the form.
+    """
+    fields = defaultdict(list)
+    files = []
+    file_count = 0
+    async for part in await request.multipart():
+        if not isinstance(part, BodyPartReader):
+            continue
+        if part.name == "file" and part.filename is not None:
+            file_count += 1
+            if file_count <= max_files:
+                files.append(await read_part(part))
+        elif part.name:
+            fields[part.name].append((await read_part(part)).decode(part.get_charset('utf-8')))
+
+    def field(name, default=None):
+        return fields[name][0] if fields[name] else default
+
+    request_data = {
+        "language": field("language"),
+        "formats": fields["formats"],
+        "data_options": json.loads(field("data_options", '{}')),
+        "format_options": json.loads(field("format_options", '{}')),
+        "advanced_text_extraction": json.loads(field("advanced_text_extraction", 'false'))
+    }
+    return request_data, files, file_count
+
+
+@routes.post('/convert_text')
+async def convert_text(request: web.Request):
+    context = RequestContext(generate_request_id())
+    logging.info(f"REQUEST_ID: {context.request_id}#################")
+    try:
+        request_data = json.loads(await request.text(), strict=False)
+        context = context.with_options(RequestOptions.from_request_data(request_data))
+        return web.json_response(await convert_image_url(request.app["session"], context))
+    except Exception as e:
+        return web.json_response(error_response(context, e, "E_OCR_006", include_url=True))
+
+
+@routes.post('/convert_text_multipart')
+async def convert_text_multipart(request: web.Request):
+    context = RequestContext(generate_request_id())
+    try:
+        request_data, files, _ = await parse_form_data(request)
+        if not files:
+            error_dict = {"code": "E_OCR_007", "message": "No file part"}
+            logging.error(error_dict)
+            return web.json_response({"status": 0, "request_id": context.request_id,
+                                      "version": flask_app.api_version, "error": error_dict})
+
+        context = context.with_options(RequestOptions.from_request_data(request_data))
+        return web.json_response(await convert_image_bytes(files[0], context))
+    except Exception as e:
+        return web.json_response(error_response(context, e, "E_OCR_009", include_url=False))
+
+
+@routes.post('/convert_text_batch')
+async def convert_text_batch(request: web.Request):
+    request_id = generate_request_id()
+    logging.info(f"BATCH REQUEST_ID: {request_id}#################")
+    try:
+        if request.content_type.startswith("multipart/"):
+            # Files beyond BATCH_MAX_ITEMS are counted but not read
+            request_data, sources, count = await parse_form_data(request, max_files=BATCH_MAX_ITEMS)
+        else:
+            request_data = json.loads(await request.text(), strict=False)
+            sources = request_data.get("src") or []
+            if isinstance(sources, str):
+                sources = [sources]
+            count = len(sources)
+
+        if not count:
+            raise CustomExceptionAndLog("E_OCR_023", "No image in batch")
+        if count > BATCH_MAX_ITEMS:
+            raise CustomExceptionAndLog("E_OCR_024", f"Batch exceeds the maximum of {BATCH_MAX_ITEMS} images")
+    except Exception as e:
+        if isinstance(e, CustomExceptionAndLog):
+            error_dict = e.error_dict
+        else:
+            error_dict = {"code": "E_OCR_025", "message": str(e)}
+            logging.error(error_dict)
+        return web.json_response({"status": 0, "request_id": request_id, "version": flask_app.api_version,
+                                  "error": error_dict})
+
+    async def convert_item(index: int, source):
+        if isinstance(source, bytes):
+            context = RequestContext(generate_request_id(), RequestOptions.from_request_data(request_data))
+            try:
+                return index, await admitted_item(convert_image_bytes, source, context)
+            except Exception as e:
+                return index, error_response(context, e, "E_OCR_009", include_url=False)
+
+        context = RequestContext(generate_request_id(),
+                                 RequestOptions.from_request_data(dict(request_data, src=source)))
+        try:
+            return index, await admitted_item(convert_image_url, request.app["session"], context)
+        except Exception as e:
+            return index, error_response(context, e, "E_OCR_006", include_url=True)
+
+    completed = iter_completed((convert_item(index, source) for index, source in enumerate(sources)),
+                               BATCH_STREAM_WINDOW)
+
+    stream = request.query.get("stream", "false").lower() in ("1", "true", "yes") \
+        or "application/x-ndjson" in request.headers.get("Accept", "")
+    if not stream:
+        results = sorted([result async for result in completed], key=lambda result: result[0])
+        return web.json_response({"status": 1, "request_id": request_id, "version": flask_app.api_version,
+                                  "results": [response_dict for _, response_dict in results]})
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "X-Request-Id": request_id})
+    await response.prepare(request)
+    async for index, response_dict in completed:
+        # write() waits for the transport to drain, so a slow client slows down the batch
+        await response.write((json.dumps(dict(response_dict, index=index)) + "\n").encode('utf-8'))
+    await response.write_eof()
+    return response
+
+
+async def admitted_item(convert, *args) -> dict:
+    """
+    Convert an image of a batch once it has its own processing slot, so that a batch counts as many requests as it
+    has images in flight. A rejection (OverloadedError) becomes the error response of the image.
+    """
+    if admission is None:
+        return await convert(*args)
+
+    await admission.acquire_async()
+    try:
+        return await convert(*args)
+    finally:
+        await admission.release_async()
+
+
+async def iter_completed(coroutines, window: int):
+    """
+    Run the coroutines with at most ``window`` of them in flight and yield their results in completion order.
+    A new coroutine is only started when a result is taken, as in BatchProcessor.iter_completed.
+    """
+    pending = iter(coroutines)
+    in_flight = {asyncio.ensure_future(coroutine) for coroutine in islice(pending, window)}
+    try:
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                next_coroutine = next(pending, None)
+                if next_coroutine is not None:
+                    in_flight.add(asyncio.ensure_future(next_coroutine))
+                yield task.result()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        for coroutine in pending:
+            coroutine.close()
+
+
+@routes.get('/metrics')
+async def metrics_endpoint(request: web.Request):
+    return web.Response(body=metrics.REGISTRY.render().encode('utf-8'),
+                        headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+@web.middleware
+async def request_metrics(request: web.Request, handler):
+    """Record the duration, the status and the number of in-flight requests per route, as the Flask app does."""
+    resource = request.match_info.route.resource
+    endpoint = resource.canonical if resource is not None else "unmatched"
+    start_time = time.perf_counter()
+    status = 500
+    with metrics.REQUESTS_IN_FLIGHT.track_in_progress(endpoint=endpoint):
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            metrics.REQUEST_DURATION.observe(time.perf_counter() - start_time, endpoint=endpoint)
+            metrics.REQUESTS.inc(endpoint=endpoint, status=status)
+
+
+@web.middleware
+async def admission_control(request: web.Request, handler):
+    """Answer at once with HTTP 503 and Retry-After when the conversion routes are at capacity."""
+    if admission is None or request.path not in ADMITTED_PATHS:
+        return await handler(request)
+
+    try:
+        await admission.acquire_async()
+    except OverloadedError as e:
+        return web.json_response({
+            "status": 0,
+            "request_id": generate_request_id(),
+            "version": flask_app.api_version,
+            "error": e.error_dict
+        }, status=503, headers={"Retry-After": str(e.retry_after)})
+
+    try:
+        return await handler(request)
+    finally:
+        await admission.release_async()
+
+
+async def http_session(app: web.Application):
+    """Open the download session with the app and close it on shutdown."""
+    app["session"] = create_session()
+    yield
+    await app["session"].close()
+
+
+def create_app(argv=None) -> web.Application:
+    """Create the aiohttp application (usable with `python -m aiohttp.web async_app:create_app`)."""
+    # Multipart uploads are streamed with a limit per part, the other bodies are limited to DOWNLOAD_MAX_BYTES
+    app = web.Application(client_max_size=DOWNLOAD_MAX_BYTES, middlewares=[request_metrics, admission_control])
+    app.add_routes(routes)
+    app.cleanup_ctx.append(http_session)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), port=8080)
@@ -0,0 +1,5 @@
+"""
+Title: Benchmarks
+Author: Trojan
+Date: 17-10-2026
+"""
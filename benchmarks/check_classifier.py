@@ -0,0 +1,122 @@
+"""
+Title: Classifier consistency check
+Author: Trojan
+Date: 17-10-2026
+
+Usage: python -m benchmarks.check_classifier [--classifier-path classifier.safetensors]
+
+Checks that the fast paths of TypegroupsClassifier.classify agree with the PIL crop loop: the vectorized patch
+extraction gives the same scores, the fully convolutional inference gives scores within FULLY_CONVOLUTIONAL_TOLERANCE
+and the blank patch selection honours its bounds. Exits with status 1 if a check fails.
+"""
+import argparse
+import math
+import sys
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from benchmarks.synthetic_images import build_corpus
+
+# Scores of the vectorized path and of the PIL crop loop may only differ by floating-point noise
+VECTORIZED_TOLERANCE = 1e-5
+
+# Largest difference of the normalized (softmax) class scores between the fully convolutional and patch-wise paths
+FULLY_CONVOLUTIONAL_TOLERANCE = 0.1
+
+# Image sizes which are not multiples of the stride (the last patches cross the borders), and a page narrower
+# than a patch
+IMAGE_SIZES = ((937, 611), (181, 150))
+
+STRIDE = 75
+BATCH_SIZE = 64
+
+
+def load_classifier(classifier_path: Optional[str] = None, seed: int = 0):
+    """
+    Load a TypegroupsClassifier file, or build a DenseNet with random weights (the architecture of the shipped
+    handwriting classifier, giving the same timings).
+    """
+    import torch
+    from ocrd_typegroups_classifier.typegroups_classifier import TypegroupsClassifier
+
+    if classifier_path:
+        return TypegroupsClassifier.load(classifier_path)
+    from ocrd_typegroups_classifier.network.densenet import DenseNet
+    torch.manual_seed(seed)
+    return TypegroupsClassifier({"handwritten": 0, "printed": 1}, DenseNet(num_classes=2))
+
+
+def normalized(scores: Dict[str, float]) -> Dict[str, float]:
+    """Softmax of the class scores, as used by the handwriting detection."""
+    total = sum(math.exp(score) for score in scores.values())
+    return {key: math.exp(score) / total for key, score in scores.items()}
+
+
+def max_difference(expected: Dict[str, float], actual: Dict[str, float]) -> float:
+    return max(abs(expected[key] - actual[key]) for key in expected)
+
+
+def check_image(classifier, image: Image.Image) -> List[str]:
+    """Run every check on one image, returning the failures."""
+    failures = []
+    label = f"{image.size[0]}x{image.size[1]}"
+
+    loop_scores = classifier.classify(image, STRIDE, BATCH_SIZE, vectorized=False)
+    vectorized_scores = classifier.classify(image, STRIDE, BATCH_SIZE, vectorized=True)
+    difference = max_difference(loop_scores, vectorized_scores)
+    print(f"{label:<10} vectorized vs PIL crops:           max score difference {difference:.2e}")
+    if set(loop_scores) != set(vectorized_scores) or difference > VECTORIZED_TOLERANCE:
+        failures.append(f"{label}: vectorized scores {vectorized_scores} differ from {loop_scores}")
+
+    if hasattr(classifier.network, "feature_map"):
+        fully_convolutional_scores = classifier.classify(image, STRIDE, BATCH_SIZE, fully_convolutional=True)
+        difference = max_difference(normalized(loop_scores), normalized(fully_convolutional_scores))
+        print(f"{label:<10} fully convolutional vs patch-wise: max normalized score difference {difference:.4f}")
+        if difference > FULLY_CONVOLUTIONAL_TOLERANCE:
+            failures.append(f"{label}: fully convolutional scores {fully_convolutional_scores} are more than "
+                            f"{FULLY_CONVOLUTIONAL_TOLERANCE} away from {loop_scores}")
+
+    stats = {}
+    classifier.classify(image, STRIDE, BATCH_SIZE, skip_blank=True, max_patches=4, stats=stats)
+    print(f"{label:<10} skip blank (max 4 patches):         {stats['patches_evaluated']} of "
+          f"{stats['patches_total']} patches")
+    if not 1 <= stats["patches_evaluated"] <= 4:
+        failures.append(f"{label}: {stats['patches_evaluated']} patches evaluated with max_patches=4")
+    return failures
+
+
+def check_blank_page(classifier) -> List[str]:
+    """A blank page is classified from a single patch."""
+    stats = {}
+    classifier.classify(Image.new("RGB", IMAGE_SIZES[0], "white"), STRIDE, BATCH_SIZE, skip_blank=True, stats=stats)
+    print(f"{'blank':<10} skip blank:                          {stats['patches_evaluated']} of "
+          f"{stats['patches_total']} patches")
+    if stats["patches_evaluated"] != 1:
+        return [f"blank page: {stats['patches_evaluated']} patches evaluated instead of 1"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the fast paths of the typegroups classifier.")
+    parser.add_argument("--classifier-path", default=None,
+                        help="TypegroupsClassifier file (a randomly initialized DenseNet is used otherwise).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic images and random weights.")
+    args = parser.parse_args()
+
+    classifier = load_classifier(args.classifier_path, args.seed)
+    corpus = build_corpus(len(IMAGE_SIZES), seed=args.seed)
+
+    failures = []
+    for (_, image), size in zip(corpus, IMAGE_SIZES):
+        failures += check_image(classifier, image.resize(size, Image.BILINEAR))
+    failures += check_blank_page(classifier)
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    print("All checks passed" if not failures else f"{len(failures)} checks failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Title: Image context check
+Author: Trojan
+Date: 17-10-2026
+
+Usage: python -m benchmarks.check_image_context
+
+Checks that ImageContext orients photos by their EXIF tag: JPEGs stored sideways or upside down with an orientation
+tag give upright RGB, BGR and grayscale views and the upright size. Exits with status 1 if a check fails.
+"""
+import sys
+from io import BytesIO
+from typing import List
+
+from PIL import Image
+
+from utilities.image_context import ImageContext
+
+# EXIF orientation tag
+ORIENTATION_TAG = 0x0112
+
+# Orientation: transposition storing the upright image so that the tag turns it back upright
+STORED_TRANSPOSITIONS = {
+    1: None,
+    3: Image.ROTATE_180,
+    6: Image.ROTATE_90,
+    8: Image.ROTATE_270,
+}
+
+# Upright image: a red top left quadrant on a white page, wider than high
+WIDTH, HEIGHT = 160, 100
+
+
+def upright_image() -> Image.Image:
+    image = Image.new("RGB", (WIDTH, HEIGHT), "white")
+    image.paste((255, 0, 0), (0, 0, WIDTH // 2, HEIGHT // 2))
+    return image
+
+
+def encode(orientation: int) -> bytes:
+    """JPEG of the upright image as a camera would store it with the orientation tag."""
+    image = upright_image()
+    if STORED_TRANSPOSITIONS[orientation] is not None:
+        image = image.transpose(STORED_TRANSPOSITIONS[orientation])
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    output = BytesIO()
+    image.save(output, "JPEG", quality=95, exif=exif)
+    return output.getvalue()
+
+
+def check_orientation(orientation: int) -> List[str]:
+    """Decode a JPEG with the orientation tag, returning the failures."""
+    failures = []
+    label = f"orientation {orientation}"
+    image_context = ImageContext(encode(orientation))
+
+    # Pixels in the middle of the red (top left) and white (bottom right) quadrants
+    red_x, red_y = WIDTH // 4, HEIGHT // 4
+    white_x, white_y = 3 * WIDTH // 4, 3 * HEIGHT // 4
+
+    checks = {
+        "size": image_context.size == (WIDTH, HEIGHT),
+        "rgb size": image_context.rgb.size == (WIDTH, HEIGHT),
+        "bgr shape": image_context.bgr.shape[:2] == (HEIGHT, WIDTH),
+        "gray shape": image_context.gray.shape == (HEIGHT, WIDTH),
+    }
+    if all(checks.values()):
+        red, green, _ = image_context.rgb.getpixel((red_x, red_y))
+        _, bgr_green, bgr_red = image_context.bgr[red_y, red_x]
+        checks.update({
+            "rgb red quadrant": red > 200 and green < 60,
+            "rgb white quadrant": min(image_context.rgb.getpixel((white_x, white_y))) > 200,
+            "bgr red quadrant": bgr_red > 200 and bgr_green < 60,
+            "gray quadrants": image_context.gray[red_y, red_x] < 128 < image_context.gray[white_y, white_x],
+        })
+
+    print(f"{label:<14} size {image_context.size}: "
+          + ", ".join(f"{name} {'ok' if passed else 'FAILED'}" for name, passed in checks.items()))
+    for name, passed in checks.items():
+        if not passed:
+            failures.append(f"{label}: {name} not upright")
+    return failures
+
+
+def main():
+    failures = []
+    for orientation in STORED_TRANSPOSITIONS:
+        failures += check_orientation(orientation)
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    print("All checks passed" if not failures else f"{len(failures)} checks failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
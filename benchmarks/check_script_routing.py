@@ -0,0 +1,142 @@
+"""
+Title: Script routing check
+Author: Trojan
+Date: 17-10-2026
+
+Usage: python -m benchmarks.check_script_routing [--images samples/] [--font NotoSansCJK-Regular.ttc]
+
+Measures how often the script routing picks the language the auto mode cascade selects, on the images of --images
+and on lines of every script rendered with a CJK font. The cascade runs without routing on the real models. Exits
+with status 1 if the agreement is below MIN_AGREEMENT: SCRIPT_ROUTING_ENABLED should only be turned on once it passes.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from benchmarks.synthetic_images import FORMULAS, encode_png
+
+# Share of the images whose first routed language is the language selected by the cascade
+MIN_AGREEMENT = 0.9
+
+# Lines of text in each language, drawn above a formula
+SAMPLE_LINES = {
+    "ENGLISH": ("Solve the following equation for x.", "Find the area of the shaded region."),
+    "KOREAN": ("다음 방정식을 x에 대해 푸시오.", "색칠된 부분의 넓이를 구하시오."),
+    "JAPANESE": ("次の方程式を x について解きなさい。", "斜線部分の面積を求めなさい。"),
+    "CHINESE_SIM": ("求解下列关于 x 的方程。", "求阴影部分的面积。"),
+    "CHINESE_TRA": ("求解下列關於 x 的方程。", "求陰影部分的面積。"),
+}
+
+# Fonts with Latin, Hangul, Kana and Han glyphs, tried in order when --font isn't given
+CJK_FONTS = (
+    "NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/System/Library/Fonts/AppleSDGothicNeo.ttc",
+    "C:\\Windows\\Fonts\\malgun.ttf",
+)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def load_font(path: Optional[str], size: int) -> Optional[ImageFont.FreeTypeFont]:
+    for candidate in ([path] if path else CJK_FONTS):
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return None
+
+
+def render_samples(font_path: Optional[str], per_language: int, seed: int) -> List[Tuple[str, bytes]]:
+    """Render (name, PNG) samples holding a line of each language and a formula, or none without a CJK font."""
+    rng = random.Random(seed)
+    samples = []
+    for language, lines in SAMPLE_LINES.items():
+        for index in range(per_language):
+            font = load_font(font_path, rng.randint(22, 32))
+            if font is None:
+                return []
+            image = Image.new("RGB", (800, 200), "white")
+            draw = ImageDraw.Draw(image)
+            draw.text((rng.randint(10, 60), 40), lines[index % len(lines)], fill="black", font=font)
+            draw.text((rng.randint(10, 60), 120), rng.choice(FORMULAS), fill="black", font=font)
+            samples.append((f"{language.lower()}-{index:02d}.png", encode_png(image)))
+    return samples
+
+
+def read_images(directory: str) -> List[Tuple[str, bytes]]:
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                samples.append((name, f.read()))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the script routing against the auto mode cascade.")
+    parser.add_argument("--images", default=None, help="Directory of sample images.")
+    parser.add_argument("--font", default=None, help="Font with Latin, Hangul, Kana and Han glyphs.")
+    parser.add_argument("--per-language", type=int, default=4, help="Rendered samples per language.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the rendered samples.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    samples = read_images(args.images) if args.images else []
+    rendered = render_samples(args.font, args.per_language, args.seed)
+    if not rendered:
+        print("No CJK font found (--font), only the --images samples are checked")
+    samples += rendered
+    if not samples:
+        raise SystemExit("No samples: give --images or --font")
+
+    # The models are loaded by the app, with routing disabled so that the cascade is the reference
+    from app import app
+    from data_extractors.latex_extractor import LatexExtractor
+    from data_extractors.script_classifier import load_script_classifier
+    from utilities.image_context import ImageContext
+
+    script_classifier = load_script_classifier()
+    if script_classifier is None:
+        raise SystemExit("Script classifier not available: install Tesseract and the SCRIPT_OCR_LANGUAGES data")
+
+    agreements = within_routed = 0
+    script_ms, cascade_ms = [], []
+    for name, image_bytes in samples:
+        image_context = ImageContext(image_bytes)
+        start_time = time.perf_counter()
+        language_selection = LatexExtractor(image_context, model_registry=app.model_registry,
+                                            cascade=True).recognize_image("check")[5]
+        cascade_ms.append((time.perf_counter() - start_time) * 1000)
+        selected = language_selection["selected_model"]
+
+        # The script pass sees the image the pipeline gives it, after the diagram masking
+        script_classification = script_classifier.predict(image_context.rgb)
+        routed = script_classifier.route(script_classification["scores"])
+        script_ms.append(script_classification["elapsed_ms"])
+
+        agreements += bool(routed) and routed[0] == selected
+        within_routed += selected in routed
+        print(f"{name:<24} cascade {selected:<12} routed {', '.join(routed) or '-':<24} "
+              f"scores {script_classification['scores']}")
+
+    agreement = agreements / len(samples)
+    print(f"Routing agrees with the cascade on {agreements} of {len(samples)} images ({agreement:.1%}), the "
+          f"cascade's language is among the routed ones on {within_routed}")
+    print(f"Mean script pass {sum(script_ms) / len(script_ms):.1f} ms, mean cascade "
+          f"{sum(cascade_ms) / len(cascade_ms):.1f} ms")
+    if agreement < MIN_AGREEMENT:
+        print(f"FAILED agreement below {MIN_AGREEMENT:.0%}")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == '__main__':
+    main()
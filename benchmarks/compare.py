@@ -0,0 +1,45 @@
+"""
+Title: Benchmark comparison
+Author: Trojan
+Date: 17-10-2026
+
+Usage: python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+
+METRICS = ("throughput_per_second", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+
+
+def load_results(path: str) -> tuple:
+    with open(path) as f:
+        content = json.load(f)
+    return {result["name"]: result for result in content["results"]}, content["metadata"]
+
+
+def change(baseline: float, candidate: float) -> str:
+    if not baseline:
+        return "n/a"
+    return f"{(candidate - baseline) / baseline * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    baseline, baseline_metadata = load_results(args.baseline)
+    candidate, candidate_metadata = load_results(args.candidate)
+    print(f"baseline:  {baseline_metadata.get('commit')} ({baseline_metadata.get('timestamp')})")
+    print(f"candidate: {candidate_metadata.get('commit')} ({candidate_metadata.get('timestamp')})")
+
+    for name in [name for name in baseline if name in candidate]:
+        print(f"\n{name}")
+        for metric in METRICS:
+            before, after = baseline[name][metric], candidate[name][metric]
+            print(f"  {metric:<22} {before:>12.3f} -> {after:>12.3f}  {change(before, after):>8}")
+
+
+if __name__ == '__main__':
+    main()
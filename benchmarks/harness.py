@@ -0,0 +1,151 @@
+"""
+Title: Benchmark harness
+Author: Trojan
+Date: 17-10-2026
+"""
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from itertools import cycle, islice
+from typing import Any, Callable, List, Optional, Sequence
+
+import psutil
+
+
+@dataclass
+class BenchmarkResult:
+    """Latency distribution, throughput and memory of one benchmark."""
+    name: str
+    iterations: int
+    total_seconds: float
+    throughput_per_second: float
+    mean_ms: float
+    min_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    rss_start_mb: float
+    peak_rss_mb: float
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Percentile of sorted values, interpolating linearly between the closest ranks."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(name: str, latencies: Sequence[float], total_seconds: float, rss_start: float,
+              peak_rss: float) -> BenchmarkResult:
+    """Build the result of a benchmark from the latencies (seconds) of its calls."""
+    values = sorted(latencies)
+    return BenchmarkResult(
+        name=name,
+        iterations=len(values),
+        total_seconds=round(total_seconds, 6),
+        throughput_per_second=round(len(values) / total_seconds, 3) if total_seconds else 0.0,
+        mean_ms=round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        min_ms=round(values[0] * 1000, 3) if values else 0.0,
+        p50_ms=round(percentile(values, 0.50) * 1000, 3),
+        p95_ms=round(percentile(values, 0.95) * 1000, 3),
+        p99_ms=round(percentile(values, 0.99) * 1000, 3),
+        max_ms=round(values[-1] * 1000, 3) if values else 0.0,
+        rss_start_mb=round(rss_start / 2 ** 20, 1),
+        peak_rss_mb=round(peak_rss / 2 ** 20, 1)
+    )
+
+
+class RssSampler:
+    """Samples the resident memory of the process in the background to find its peak during a benchmark."""
+
+    def __init__(self, interval_ms: float = 5):
+        self.interval = interval_ms / 1000.0
+        self._process = psutil.Process()
+        self.start_rss = self.peak_rss = self._process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._process.memory_info().rss)
+
+
+def run_benchmark(name: str, function: Callable[[Any], Any], inputs: Sequence[Any], iterations: int,
+                  warmup: int = 3, setup: Optional[Callable[[Any], Any]] = None) -> BenchmarkResult:
+    """
+    Call the function on the inputs (cycling through them) and measure every call.
+
+    :param name: Name of the benchmark in the results.
+    :param function: Function under test, called with one (prepared) input.
+    :param inputs: Inputs of the calls.
+    :param iterations: Number of measured calls.
+    :param warmup: Number of calls made before measuring (model warm-up, lazy initializations).
+    :param setup: Untimed preparation of every input (e.g. building a fresh object the call modifies).
+    """
+    prepare = setup or (lambda value: value)
+    for value in islice(cycle(inputs), warmup):
+        function(prepare(value))
+
+    latencies: List[float] = []
+    with RssSampler() as sampler:
+        start_time = time.perf_counter()
+        for value in islice(cycle(inputs), iterations):
+            prepared = prepare(value)
+            call_start = time.perf_counter()
+            function(prepared)
+            latencies.append(time.perf_counter() - call_start)
+        total_seconds = time.perf_counter() - start_time
+    return summarize(name, latencies, total_seconds, sampler.start_rss, sampler.peak_rss)
+
+
+def environment_metadata(parameters: dict) -> dict:
+    """Describe the code and the machine the benchmarks ran on, so that runs of different commits can be compared."""
+    def git(*args):
+        try:
+            return subprocess.check_output(("git",) + args, stderr=subprocess.DEVNULL, text=True).strip()
+        except Exception:
+            return None
+
+    try:
+        import torch
+        torch_version, torch_threads = torch.__version__, torch.get_num_threads()
+    except ImportError:
+        torch_version, torch_threads = None, None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch_version,
+        "torch_threads": torch_threads,
+        "parameters": parameters
+    }
+
+
+def save_results(results: List[BenchmarkResult], metadata: dict, output_path: str):
+    """Store the results and their metadata as JSON."""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({"metadata": metadata, "results": [asdict(result) for result in results]}, f, indent=2)
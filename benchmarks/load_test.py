@@ -0,0 +1,200 @@
+"""
+Title: Load test
+Author: Trojan
+Date: 17-10-2026
+
+Usage: python -m benchmarks.load_test --target http://localhost:8080 (--rps 20 | --concurrency 8) [--duration 60]
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import requests
+
+from benchmarks.harness import environment_metadata, percentile
+from benchmarks.origin import ImageOrigin
+from benchmarks.synthetic_images import build_corpus, encode_png
+
+ENDPOINTS = ("convert_text", "convert_text_multipart")
+
+
+@dataclass
+class EndpointStats:
+    """Latencies and outcomes of the requests sent to one endpoint."""
+    latencies: List[float] = field(default_factory=list)
+    outcomes: Counter = field(default_factory=Counter)
+
+    def summary(self, elapsed_seconds: float) -> dict:
+        values = sorted(self.latencies)
+        return {
+            "requests": len(values),
+            "throughput_per_second": round(len(values) / elapsed_seconds, 3) if elapsed_seconds else 0.0,
+            "succeeded": self.outcomes["ok"],
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+            "outcomes": dict(self.outcomes)
+        }
+
+
+class LoadGenerator:
+    """
+    Sends conversion requests to a running server, either at a fixed rate (open loop) or from a fixed number of
+    concurrent clients (closed loop), and records the latency and the outcome of every request.
+    """
+
+    def __init__(self, target: str, origin: ImageOrigin, images: Dict[str, bytes], endpoints=ENDPOINTS,
+                 language: str = "ENGLISH", timeout: float = 120):
+        self.target = target.rstrip("/")
+        self.origin = origin
+        self.images = list(images.items())
+        self.endpoints = list(endpoints)
+        self.language = language
+        self.timeout = timeout
+        self.stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._sequence = itertools.count()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, scheduled_time: Optional[float] = None):
+        """
+        Send the next request (endpoints and images are used in turn). With an open loop, the latency is measured
+        from the time the request was scheduled, so that a saturated server is not hidden by late sends.
+        """
+        index = next(self._sequence)
+        endpoint = self.endpoints[index % len(self.endpoints)]
+        name, image_bytes = self.images[index % len(self.images)]
+        start_time = scheduled_time if scheduled_time is not None else time.perf_counter()
+        try:
+            if endpoint == "convert_text":
+                response = self._session().post(f"{self.target}/convert_text", timeout=self.timeout, data=json.dumps({
+                    "src": self.origin.url(name), "language": self.language, "formats": ["text", "data"]
+                }))
+            else:
+                response = self._session().post(
+                    f"{self.target}/convert_text_multipart", timeout=self.timeout,
+                    files={"file": (name, image_bytes, "image/png")},
+                    data={"language": self.language, "formats": ["text", "data"]}
+                )
+            outcome = self._outcome(response)
+        except requests.Timeout:
+            outcome = "CLIENT_TIMEOUT"
+        except requests.RequestException as e:
+            outcome = f"CLIENT_{type(e).__name__}"
+        latency = time.perf_counter() - start_time
+
+        with self._lock:
+            self.stats[endpoint].latencies.append(latency)
+            self.stats[endpoint].outcomes[outcome] += 1
+
+    @staticmethod
+    def _outcome(response: requests.Response) -> str:
+        """"ok", the E_OCR_0xx code of the error, or the HTTP status when the body is not a conversion response."""
+        try:
+            body = response.json()
+        except ValueError:
+            return f"HTTP_{response.status_code}"
+        if body.get("status") == 1:
+            return "ok"
+        return (body.get("error") or {}).get("code") or f"HTTP_{response.status_code}"
+
+    def run_rate(self, rps: float, duration: float, max_workers: int) -> float:
+        """Send rps requests per second for duration seconds, whatever the response times are."""
+        interval = 1.0 / rps
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="load") as executor:
+            start_time = time.perf_counter()
+            for sequence in itertools.count():
+                scheduled_time = start_time + sequence * interval
+                if scheduled_time - start_time >= duration:
+                    break
+                delay = scheduled_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, scheduled_time)
+        return time.perf_counter() - start_time
+
+    def run_concurrency(self, concurrency: int, duration: float) -> float:
+        """Keep concurrency requests in flight for duration seconds."""
+        start_time = time.perf_counter()
+
+        def client():
+            while time.perf_counter() - start_time < duration:
+                self.send()
+
+        threads = [threading.Thread(target=client, name=f"load-{index}") for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start_time
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load test a running server with a local image origin.")
+    parser.add_argument("--target", default="http://127.0.0.1:8080", help="Base URL of the server under test.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--rps", type=float, help="Requests per second (open loop).")
+    mode.add_argument("--concurrency", type=int, help="Concurrent clients (closed loop).")
+    parser.add_argument("--duration", type=float, default=60, help="Duration of the test in seconds.")
+    parser.add_argument("--max-workers", type=int, default=256, help="Maximum requests in flight with --rps.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma separated endpoints to exercise.")
+    parser.add_argument("--language", default="ENGLISH", help="Language sent with the requests ('' for auto mode).")
+    parser.add_argument("--images", type=int, default=32, help="Number of synthetic images in the corpus.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic images.")
+    parser.add_argument("--origin-host", default="127.0.0.1", help="Interface the image origin listens on.")
+    parser.add_argument("--origin-port", type=int, default=0, help="Port of the image origin (0 for any).")
+    parser.add_argument("--origin-latency-ms", type=float, default=0, help="Latency of the image origin.")
+    parser.add_argument("--origin-bandwidth-kbps", type=float, default=None,
+                        help="Bandwidth of every image transfer in kilobytes per second.")
+    parser.add_argument("--timeout", type=float, default=120, help="Client timeout of a request in seconds.")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)}")
+
+    images = {name: encode_png(image) for name, image in build_corpus(args.images, seed=args.seed)}
+    origin = ImageOrigin(images, host=args.origin_host, port=args.origin_port, latency_ms=args.origin_latency_ms,
+                         bandwidth_kbps=args.origin_bandwidth_kbps)
+    with origin:
+        generator = LoadGenerator(args.target, origin, images, endpoints, args.language, args.timeout)
+        if args.rps:
+            elapsed = generator.run_rate(args.rps, args.duration, args.max_workers)
+        else:
+            elapsed = generator.run_concurrency(args.concurrency, args.duration)
+
+    summaries = {endpoint: generator.stats[endpoint].summary(elapsed) for endpoint in endpoints}
+    for endpoint, summary in summaries.items():
+        print(f"{endpoint:<24} {summary['requests']:>6} requests  {summary['throughput_per_second']:>8.2f}/s  "
+              f"p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms  p99 {summary['p99_ms']:>9.2f} ms")
+        print(f"{'':<24} outcomes: {summary['outcomes']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"metadata": environment_metadata(vars(args)), "elapsed_seconds": elapsed,
+                       "endpoints": summaries}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Title: Image origin
+Author: Trojan
+Date: 17-10-2026
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+class ImageOrigin:
+    """
+    Local HTTP server standing in for the image hosts: serves the images of a corpus at /<name>, optionally
+    with the latency and the bandwidth of a remote host.
+    """
+
+    # Bytes written at once when the bandwidth is limited
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, images: Dict[str, bytes], host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0,
+                 bandwidth_kbps: Optional[float] = None):
+        """
+        :param images: Encoded images by name.
+        :param host: Interface to listen on.
+        :param port: Port to listen on (0 picks a free port).
+        :param latency_ms: Delay before the response headers are sent.
+        :param bandwidth_kbps: Transfer rate of every response body in kilobytes per second (None for unlimited).
+        """
+        self.images = images
+        self.latency_seconds = latency_ms / 1000.0
+        self.bandwidth_kbps = bandwidth_kbps
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="image-origin", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def start(self) -> "ImageOrigin":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def write_body(self, stream, body: bytes):
+        """Write the body, pacing the chunks to the configured bandwidth."""
+        if not self.bandwidth_kbps:
+            stream.write(body)
+            return
+        start_time = time.monotonic()
+        for offset in range(0, len(body), self.CHUNK_SIZE):
+            stream.write(body[offset:offset + self.CHUNK_SIZE])
+            expected_time = (offset + self.CHUNK_SIZE) / (self.bandwidth_kbps * 1024)
+            delay = start_time + expected_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _handler_class(self):
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if origin.latency_seconds:
+                    time.sleep(origin.latency_seconds)
+                body = origin.images.get(self.path.lstrip("/"))
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                origin.write_body(self.wfile, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
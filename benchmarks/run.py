@@ -0,0 +1,165 @@
+"""
+Title: Benchmark runner
+Author: Trojan
+Date: 17-10-2026
+
+Usage: python -m benchmarks.run [--benchmarks classify,routes] [--iterations 50] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from benchmarks.check_classifier import load_classifier
+from benchmarks.harness import BenchmarkResult, environment_metadata, run_benchmark, save_results
+from benchmarks.origin import ImageOrigin
+from benchmarks.stubs import load_stub_app
+from benchmarks.synthetic_images import FORMULAS, build_corpus, encode_png
+
+RESULTS_PATH = os.path.join('benchmarks', 'results')
+
+
+def benchmark_classify(args, corpus) -> List[BenchmarkResult]:
+    """TypegroupsClassifier.classify as called by the handwriting detection."""
+    classifier = load_classifier(args.classifier_path, args.seed)
+
+    images = [image for _, image in corpus]
+    return [
+        run_benchmark("classify", lambda image: classifier.classify(image, 75, 64, False), images,
+                      args.iterations, args.warmup),
+        run_benchmark("classify_pil_crops", lambda image: classifier.classify(image, 75, 64, False, vectorized=False),
+                      images, args.iterations, args.warmup),
+        run_benchmark("classify_fully_convolutional",
+                      lambda image: classifier.classify(image, 75, 64, False, fully_convolutional=True),
+                      images, args.iterations, args.warmup),
+        run_benchmark("classify_skip_blank", lambda image: classifier.classify(image, 75, 64, False, skip_blank=True),
+                      images, args.iterations, args.warmup),
+    ]
+
+
+def benchmark_diagram_masking(args, corpus) -> List[BenchmarkResult]:
+    """LatexExtractor diagram detection and masking, on a freshly decoded image every time."""
+    from data_extractors.latex_extractor import LatexExtractor
+    from utilities.image_context import ImageContext
+
+    images = [encode_png(image) for _, image in corpus]
+    return [run_benchmark("diagram_masking", lambda extractor: extractor._detect_and_remove_diagrams("benchmark"),
+                          images, args.iterations, args.warmup,
+                          setup=lambda image_bytes: LatexExtractor(ImageContext(image_bytes)))]
+
+
+def benchmark_convert_to_ascii(args, corpus) -> List[BenchmarkResult]:
+    """AsciimathConverter.convert_to_ascii on the formulas drawn on the images."""
+    from py_asciimath.translator.translator import Tex2ASCIIMath
+    from data_extractors.asciimath_converter import AsciimathConverter
+
+    converter = AsciimathConverter(converter_model=Tex2ASCIIMath(log=False, inplace=True))
+    expressions = [f"{formula} $${FORMULAS[(index + 1) % len(FORMULAS)]}$$" for index, formula in enumerate(FORMULAS)]
+    return [run_benchmark("convert_to_ascii", lambda latex: converter.convert_to_ascii("benchmark", latex),
+                          expressions, args.iterations, args.warmup)]
+
+
+def benchmark_construct_response(args, corpus) -> List[BenchmarkResult]:
+    """construct_response with every format and data option requested."""
+    from utilities.core_utils import construct_response
+    from utilities.request_context import RequestContext, RequestOptions
+
+    app = SimpleNamespace(api_version="benchmark")
+    options = RequestOptions(image_url="http://localhost/image.png", formats=("text", "data"),
+                             include_text=True, include_latex=True, include_asciimath=True)
+    context = RequestContext("benchmark", options, image_width=800, image_height=300)
+    data = [{"type": "asciimath", "value": "x^2 + y^2 = r^2"}, {"type": "latex", "value": FORMULAS[0]}]
+    confidence_per_line = {0: 95.1, 1: 91.7, 2: 88.3}
+
+    def build(_):
+        return construct_response(app, context, "text", "", FORMULAS[1], data, False, True, 92.4,
+                                  confidence_per_line, None)
+
+    return [run_benchmark("construct_response", build, [None], args.iterations, args.warmup)]
+
+
+def benchmark_routes(args, corpus) -> List[BenchmarkResult]:
+    """The full /convert_text and /convert_text_multipart routes, with stub Pix2Text models."""
+    app = load_stub_app(latency_ms=args.model_latency_ms)
+    client = app.test_client()
+    images = {name: encode_png(image) for name, image in corpus}
+    options = {"formats": ["text", "data"], "data_options": {"include_asciimath": True, "include_latex": True},
+               "language": args.language}
+
+    def post_url(url):
+        response = client.post('/convert_text', data=json.dumps(dict(options, src=url)))
+        assert response.get_json().get("status") == 1, response.get_json()
+
+    def post_file(item):
+        name, image_bytes = item
+        response = client.post('/convert_text_multipart', content_type='multipart/form-data', data={
+            "file": (BytesIO(image_bytes), name),
+            "language": args.language,
+            "formats": options["formats"],
+            "data_options": json.dumps(options["data_options"])
+        })
+        assert response.get_json().get("status") == 1, response.get_json()
+
+    with ImageOrigin(images) as origin:
+        return [
+            run_benchmark("route_convert_text", post_url, [origin.url(name) for name in images],
+                          args.iterations, args.warmup),
+            run_benchmark("route_convert_text_multipart", post_file, list(images.items()),
+                          args.iterations, args.warmup),
+        ]
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "classify": benchmark_classify,
+    "diagram_masking": benchmark_diagram_masking,
+    "convert_to_ascii": benchmark_convert_to_ascii,
+    "construct_response": benchmark_construct_response,
+    "routes": benchmark_routes,
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic images.")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS),
+                        help=f"Comma separated benchmarks to run, among: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--images", type=int, default=16, help="Number of synthetic images.")
+    parser.add_argument("--iterations", type=int, default=50, help="Measured calls per benchmark.")
+    parser.add_argument("--warmup", type=int, default=3, help="Calls before measuring.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic images.")
+    parser.add_argument("--language", default="ENGLISH", help="Language sent to the routes ('' for auto mode).")
+    parser.add_argument("--model-latency-ms", type=float, default=0, help="Delay of every stub model call.")
+    parser.add_argument("--classifier-path", default=None,
+                        help="TypegroupsClassifier file (a randomly initialized DenseNet is used otherwise).")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/<commit>.json).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logging.disable(logging.INFO)
+
+    names = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    corpus = build_corpus(args.images, seed=args.seed)
+    results = []
+    for name in names:
+        for result in BENCHMARKS[name](args, corpus):
+            results.append(result)
+            print(f"{result.name:<30} {result.throughput_per_second:>10.2f}/s  p50 {result.p50_ms:>9.2f} ms  "
+                  f"p95 {result.p95_ms:>9.2f} ms  p99 {result.p99_ms:>9.2f} ms  peak RSS {result.peak_rss_mb:>8.1f} MB")
+
+    metadata = environment_metadata(vars(args))
+    output_path = args.output or os.path.join(RESULTS_PATH, f"{(metadata['commit'] or 'unknown')[:12]}"
+                                                            f"{'-dirty' if metadata['dirty'] else ''}.json")
+    save_results(results, metadata, output_path)
+    print(f"Results written to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
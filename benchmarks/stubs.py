@@ -0,0 +1,68 @@
+"""
+Title: Benchmark stubs
+Author: Trojan
+Date: 17-10-2026
+"""
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, List
+
+# Lines returned by the stub model, shaped like the output of Pix2Text.recognize_text_formula
+STUB_LINES = (
+    {"type": "text", "text": "Solve the following equation for x. ", "line_number": 0, "score": 0.97},
+    {"type": "embedding", "text": r"$x^2 + y^2 = r^2$", "line_number": 0, "score": 0.93},
+    {"type": "isolated", "text": r"$$\frac{a+b}{c-d} = \sqrt{x_1 x_2}$$", "line_number": 1, "score": 0.91},
+)
+
+
+class StubRecognizer:
+    """
+    Formula recognizer stand-in, only there so that enable_formula_batching finds a latex_ocr to wrap.
+    StubPix2Text.recognize_text_formula returns fixed lines without calling it, so the micro-batcher is not
+    exercised by the route benchmarks.
+    """
+
+    def recognize(self, images, batch_size: int = 1, **kwargs) -> List[dict]:
+        return [{"text": STUB_LINES[2]["text"], "score": STUB_LINES[2]["score"]} for _ in images]
+
+
+class StubPix2Text:
+    """
+    Pix2Text stand-in returning fixed lines after a configurable delay, so that the routes can be benchmarked
+    without the models (the delay stands for the model time, the rest of the pipeline runs for real).
+    """
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_seconds = latency_ms / 1000.0
+        self.text_formula_ocr = SimpleNamespace(latex_ocr=StubRecognizer())
+
+    def recognize_text_formula(self, image: Any, file_type: str = 'text_formula', return_text: bool = True, **kwargs):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return [dict(line) for line in STUB_LINES]
+
+
+def load_stub_app(latency_ms: float = 0, result_cache: bool = False):
+    """
+    Import the Flask app with every language model replaced by a StubPix2Text.
+
+    The configuration is patched before the app module is imported, so this has to be called before anything
+    imports ``app``.
+
+    :param latency_ms: Delay of every stub model call.
+    :param result_cache: Keep the result cache enabled (repeated images are then answered from the cache).
+    """
+    if "app" in sys.modules:
+        raise RuntimeError("The app module is already imported, the stub models can't be installed.")
+
+    import pix2text
+    import utilities.config as config
+
+    config.SHARE_FORMULA_MODELS = False
+    config.SCRIPT_ROUTING_ENABLED = False
+    config.RESULT_CACHE_ENABLED = result_cache
+    pix2text.Pix2Text.from_config = classmethod(lambda cls, *args, **kwargs: StubPix2Text(latency_ms))
+
+    import app as app_module
+    return app_module.app
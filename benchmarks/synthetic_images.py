@@ -0,0 +1,107 @@
+"""
+Title: Synthetic images
+Author: Trojan
+Date: 17-10-2026
+"""
+import random
+from io import BytesIO
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ocrd_typegroups_classifier.data.binarization import Sauvola
+from ocrd_typegroups_classifier.data.qloss import QLoss
+
+# LaTeX-like strings drawn on the images, and the LaTeX given to the AsciiMath conversion benchmark
+FORMULAS = (
+    r"x^2 + y^2 = r^2",
+    r"\frac{a+b}{c-d} = \sqrt{x_1 x_2}",
+    r"\int_0^1 f(x) dx = F(1) - F(0)",
+    r"\sum_{i=1}^{n} i = \frac{n(n+1)}{2}",
+    r"e^{i\pi} + 1 = 0",
+    r"\lim_{x \to 0} \frac{\sin x}{x} = 1",
+    r"A = \begin{pmatrix} a & b \\ c & d \end{pmatrix}",
+    r"\alpha \beta \gamma \leq \delta",
+)
+TEXT_LINES = (
+    "Solve the following equation for x.",
+    "Prove that the sum is bounded.",
+    "Find the area of the shaded region.",
+    "Compute the limit below.",
+)
+
+VARIANTS = ("clean", "qloss", "sauvola", "diagram")
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_formula_image(rng: random.Random, width: int = 800, height: int = 300, lines: int = 3) -> Image.Image:
+    """
+    Draw a few lines of text and LaTeX-like formulas (with a fraction bar on some of them) on a white page.
+    """
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = _load_font(rng.randint(18, 30))
+    line_height = height // (lines + 1)
+    for line in range(lines):
+        text = rng.choice(FORMULAS if line % 2 else TEXT_LINES)
+        x, y = rng.randint(10, 60), line_height // 2 + line * line_height
+        draw.text((x, y), text, fill="black", font=font)
+        if "frac" in text:
+            draw.line((x, y + line_height // 2, x + width // 3, y + line_height // 2), fill="black", width=2)
+    return image
+
+
+def add_diagram(image: Image.Image, rng: random.Random) -> Image.Image:
+    """Draw a geometric figure, which the diagram masking stage has to detect and mask."""
+    image = image.copy()
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    size = rng.randint(min(width, height) // 4, min(width, height) // 2)
+    x, y = rng.randint(width // 2, width - size - 1), rng.randint(0, height - size - 1)
+    draw.rectangle((x, y, x + size, y + size), outline="black", width=3)
+    draw.ellipse((x + size // 4, y + size // 4, x + 3 * size // 4, y + 3 * size // 4), outline="black", width=2)
+    return image
+
+
+def make_variant(image: Image.Image, variant: str, rng: random.Random) -> Image.Image:
+    """
+    Degrade a clean image: "qloss" re-encodes it as a low quality JPEG and "sauvola" binarizes it, as scans do.
+    """
+    if variant == "clean":
+        return image
+    if variant == "diagram":
+        return add_diagram(image, rng)
+    # QLoss and Sauvola draw their parameter from the global random module: it is drawn here and given as their range
+    if variant == "qloss":
+        quality = rng.randint(10, 60)
+        return QLoss(min_q=quality, max_q=quality)(image).convert("RGB")
+    if variant == "sauvola":
+        radius = rng.randint(2, 10)
+        return Sauvola(min_r=radius, max_r=radius)(image.convert("L")).convert("RGB")
+    raise ValueError(f"Unknown variant: {variant}")
+
+
+def build_corpus(count: int, seed: int = 0, size: Tuple[int, int] = (800, 300)) -> List[Tuple[str, Image.Image]]:
+    """
+    Build a reproducible corpus of (name, image) pairs, cycling through the variants.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(count):
+        variant = VARIANTS[index % len(VARIANTS)]
+        image = make_variant(render_formula_image(rng, *size), variant, rng)
+        corpus.append((f"{index:04d}-{variant}.png", image))
+    return corpus
+
+
+def encode_png(image: Image.Image) -> bytes:
+    """Encode an image as PNG."""
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -15,25 +15,20 @@ from torch.amp import autocast
 from utilities.config import LOGGING_LEVEL
 from utilities.custom_exception import CustomExceptionAndLog
 from utilities.general_utils import setup_logging
+from utilities.image_context import ImageContext
+from utilities.metrics import timed
 
 # Logging Configuration
 setup_logging(LOGGING_LEVEL)
 
 
 class AdvancedTextExtractor:
-    def __init__(self, downloaded_file_path: str, language: str = ""):
+    def __init__(self, image_context: ImageContext, language: str = ""):
         """Place trained data in folder: /usr/share/tesseract-ocr/4.00/tessdata/"""
         pytesseract.pytesseract.tesseract_cmd = r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
-        self.downloaded_file_path = downloaded_file_path
-        self.validate_image_format()
+        self.image_context = image_context
         self.tesseract_language = self.set_language(language)
 
-    def validate_image_format(self):
-        """Validate if the file format is supported."""
-        allowed_formats = ('.png', '.jpg', '.jpeg')
-        if not self.downloaded_file_path.lower().endswith(allowed_formats):
-            raise CustomExceptionAndLog("E_OCR_016", "Unsupported file format. Allowed formats: PNG, JPG, JPEG")
-
     def set_language(self, language: str):
         """Set the OCR language for Tesseract."""
         language_map = {
@@ -47,7 +42,7 @@ class AdvancedTextExtractor:
 
     def extract_text(self, upscale_model, request_id: str):
         try:
-            image = Image.open(self.downloaded_file_path)
+            image = self.image_context.rgb
             logging.info(f"Image loaded successfully for advanced text extraction.")
         except Exception as e:
             raise CustomExceptionAndLog("E_OCR_012", str(e))
@@ -63,7 +58,8 @@ class AdvancedTextExtractor:
             upscaled_image = self.upscale_image(image, upscale_model, request_id)
 
         try:
-            extracted_text = pytesseract.image_to_string(upscaled_image, lang=self.tesseract_language)
+            with timed("tesseract", language=self.tesseract_language):
+                extracted_text = pytesseract.image_to_string(upscaled_image, lang=self.tesseract_language)
             logging.info(f"Text extracted successfully with advanced text extraction.")
             return extracted_text
         except Exception as e:
@@ -96,7 +92,7 @@ class AdvancedTextExtractor:
             torch.cuda.empty_cache()
             input_image_data = ImageLoader.load_image(image_data)
 
-            with torch.no_grad():
+            with timed("upscaling"), torch.no_grad():
                 with autocast(device_type="cuda"):
                     upscaled_image_data = upscale_model(input_image_data)
 
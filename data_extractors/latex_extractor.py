@@ -4,40 +4,51 @@ Author: Trojan
 Date: 25-06-2024
 """
 from collections import Counter
+from contextlib import nullcontext
 import logging
-import os
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 from math import exp
 
 import cv2
-from PIL import Image
 
-from ocrd_typegroups_classifier.typegroups_classifier import TypegroupsClassifier
-from utilities.config import LOGGING_LEVEL
+from utilities.config import LOGGING_LEVEL, LANGUAGE_CODES, AUTO_MODE_CASCADE_ENABLED, AUTO_MODE_LANGUAGE_ORDER, \
+    AUTO_MODE_CONFIDENCE_THRESHOLD, SCRIPT_LANGUAGES, SCRIPT_ROUTER_MAX_MODELS, MODEL_EXECUTION_MODE, \
+    HANDWRITING_CLASSIFIER_MODEL_PATH, HANDWRITING_CLASSIFIER_FULLY_CONVOLUTIONAL, HANDWRITING_MIN_INK_DENSITY, \
+    HANDWRITING_MAX_PATCHES
+from data_extractors.script_classifier import character_script
+from utilities.classifier_registry import CLASSIFIER_REGISTRY
 from utilities.custom_exception import CustomExceptionAndLog
 from utilities.general_utils import setup_logging
+from utilities.image_context import ImageContext
+from utilities.metrics import HANDWRITING_PATCHES, timed
+from utilities.model_executor import run_in_parallel
+from utilities.result_cache import skip_caching
+from utilities.stage_cache import shared_stage_scope
 
 # Logging Configuration
 setup_logging(LOGGING_LEVEL)
 
 
 class LatexExtractor:
-    def __init__(self, downloaded_file_path: str, latex_model_english: Optional[Any] = None,
-                 latex_model_korean: Optional[Any] = None, latex_model_japanese: Optional[Any] = None,
-                 latex_model_chinese_sim: Optional[Any] = None, latex_model_chinese_tra: Optional[Any] = None):
+    def __init__(self, image_context: ImageContext, model_registry: Optional[Any] = None,
+                 cascade: bool = AUTO_MODE_CASCADE_ENABLED, language_order: Sequence[str] = AUTO_MODE_LANGUAGE_ORDER,
+                 confidence_threshold: float = AUTO_MODE_CONFIDENCE_THRESHOLD, script_classifier: Optional[Any] = None,
+                 max_routed_models: int = SCRIPT_ROUTER_MAX_MODELS, execution_mode: str = MODEL_EXECUTION_MODE):
         """
-        Initialize the LatexExtractor class with models and file path.
+        Initialize the LatexExtractor class with the model registry and the decoded image.
+        Models are fetched from the registry only when they are needed.
         """
-        self.downloaded_file_path = downloaded_file_path
+        self.image_context = image_context
         self.is_diagram = False
+        self.model_registry = model_registry
 
-        self.models = {
-            "english": (["en"], latex_model_english),
-            "korean": (["en", "ko"], latex_model_korean),
-            "japanese": (["en", "ja"], latex_model_japanese),
-            "chinese_sim": (["en", "ch_sim"], latex_model_chinese_sim),
-            "chinese_tra": (["en", "ch_tra"], latex_model_chinese_tra)
-        }
+        # Auto mode language selection
+        self.cascade = cascade
+        self.language_order = [language for language in language_order if language in LANGUAGE_CODES]
+        self.confidence_threshold = confidence_threshold
+        self.script_classifier = script_classifier
+        self.max_routed_models = max_routed_models
+        self.execution_mode = execution_mode
 
     def recognize_image(self, request_id: str):
         """
@@ -47,22 +58,50 @@ class LatexExtractor:
             self._detect_and_remove_diagrams(request_id)
             is_handwritten = self._detect_is_handwritten(request_id)
             image = self._load_image()
-            
-            latex_results = self._process_with_all_models(image)
-            
+
+            languages = self._available_languages()
+            script_classification = self._classify_script(image, request_id)
+            if script_classification is not None:
+                routed_languages = [language for language in script_classification["routed_models"]
+                                    if language in languages]
+                if self.cascade:
+                    # Routed languages go first, the cascade still escalates to the others on low confidence.
+                    languages = routed_languages + [language for language in languages
+                                                    if language not in routed_languages]
+                elif routed_languages:
+                    languages = routed_languages
+
+            # Formula detection and recognition run once and are reused by every model sharing them.
+            with shared_stage_scope():
+                if self.cascade:
+                    latex_results, detected_scripts = self._process_with_cascade(image, languages)
+                else:
+                    latex_results, detected_scripts = self._process_with_all_models(image, languages), set()
+
             highest_model = max(latex_results, key=lambda k: latex_results[k]['confidence'])
             highest_confidence_text = latex_results[highest_model]['text']
             highest_confidence_score = latex_results[highest_model]['confidence']
             highest_confidence_per_line = latex_results[highest_model]['confidence_per_line']
 
+            language_selection = {
+                "mode": "cascade" if self.cascade else "all_models",
+                "execution_mode": "sequential" if self.cascade else self.execution_mode,
+                "selected_model": highest_model,
+                "evaluated_models": list(latex_results),
+                "confidence_threshold": self.confidence_threshold if self.cascade else None,
+                "detected_scripts": sorted(detected_scripts),
+                "script_classification": script_classification
+            }
+
             logging.info(f"Extracted Text: {highest_confidence_text}")
+            logging.info(f"Language selection: {language_selection}")
             return (highest_confidence_text, round(highest_confidence_score, 7),
-                    is_handwritten, self.is_diagram, highest_confidence_per_line)
+                    is_handwritten, self.is_diagram, highest_confidence_per_line, language_selection)
 
         except Exception as e:
             raise CustomExceptionAndLog("E_OCR_001", f"Image recognition failed with error: {str(e)}")
 
-    def recognize_image_single_language(self, model: Any, request_id: str):
+    def recognize_image_single_language(self, model: Any, request_id: str, language: str = ""):
         """
         Recognize text in the image using a single OCR model.
         """
@@ -71,7 +110,7 @@ class LatexExtractor:
             is_handwritten = self._detect_is_handwritten(request_id)
             image = self._load_image()
             
-            latex_result, confidence_per_line = self._process_with_model(model, image)
+            latex_result, confidence_per_line = self._process_with_model(model, image, language)
             final_confidence_score = self._calculate_final_confidence(confidence_per_line)
 
             logging.info(f"Extracted Text: {latex_result}")
@@ -80,29 +119,104 @@ class LatexExtractor:
         except Exception as e:
             raise CustomExceptionAndLog("E_OCR_002", f"Image recognition failed with error: {str(e)}")
 
-    def _process_with_all_models(self, image):
+    def _available_languages(self):
+        """
+        Return the auto mode languages the model registry can provide, in evaluation order.
+        """
+        if self.model_registry is None:
+            return []
+        return [language for language in self.language_order if language in self.model_registry]
+
+    def _classify_script(self, image, request_id):
+        """
+        Predict the script of the image and the languages to route it to, or None if routing is not available.
+        """
+        if self.script_classifier is None:
+            return None
+        try:
+            with timed("script_classification"):
+                script_classification = self.script_classifier.predict(image)
+            script_classification["routed_models"] = self.script_classifier.route(
+                script_classification["scores"], self.max_routed_models
+            )
+            logging.info(f"Script classification: {script_classification}")
+            return script_classification
+        except Exception as e:
+            logging.error(f"Script classification failed with error: {str(e)}")
+            return None
+
+    def _process_with_all_models(self, image, languages):
+        """
+        Process the image with all OCR models, in parallel on the model executor in "thread" execution mode.
+        """
+        if self.execution_mode == "thread" and len(languages) > 1:
+            return run_in_parallel(lambda language: self._process_with_language(language, image), languages)
+        return {language: self._process_with_language(language, image) for language in languages}
+
+    def _process_with_cascade(self, image, languages):
         """
-        Process the image with all OCR models.
+        Process the image with one model at a time, stopping at the first confident one.
+        Languages matching the scripts found in the recognized text are tried first.
         """
         latex_results = {}
-        for count, (name, (language, model)) in enumerate(self.models.items(), start=1):
-            if model:
-                latex_result, confidence_per_line = self._process_with_model(model, image)
-                final_confidence_score = self._calculate_final_confidence(confidence_per_line)
+        detected_scripts = set()
+        pending = list(languages)
+        while pending:
+            language = pending.pop(0)
+            latex_results[language] = self._process_with_language(language, image)
 
-                latex_results[f"model_{count}"] = {
-                    "text": latex_result,
-                    "confidence": final_confidence_score,
-                    "language": language,
-                    "confidence_per_line": confidence_per_line
-                }
-        return latex_results
+            detected_scripts |= self._detect_scripts(latex_results[language]["text"])
+            if (latex_results[language]["confidence"] >= self.confidence_threshold
+                    and detected_scripts <= self._language_scripts(language)):
+                break
+            pending = self._prioritize_languages(pending, detected_scripts)
+        return latex_results, detected_scripts
 
-    def _process_with_model(self, model, image):
+    def _process_with_language(self, language, image):
+        """
+        Process the image with the model of a language and summarize its result.
+        """
+        model = self.model_registry.get(language)
+        latex_result, confidence_per_line = self._process_with_model(model, image, language)
+        return {
+            "text": latex_result,
+            "confidence": self._calculate_final_confidence(confidence_per_line),
+            "language": list(LANGUAGE_CODES[language]),
+            "confidence_per_line": confidence_per_line
+        }
+
+    @staticmethod
+    def _detect_scripts(text):
+        """
+        Return the non-Latin scripts found in a piece of text.
+        """
+        return {script for script in map(character_script, text) if script not in (None, "Latin")}
+
+    @staticmethod
+    def _language_scripts(language):
+        """
+        Return the scripts a language model is able to recognize.
+        """
+        return {script for script, languages in SCRIPT_LANGUAGES.items() if language in languages} | {"Latin"}
+
+    @staticmethod
+    def _prioritize_languages(pending, detected_scripts):
+        """
+        Move the languages able to recognize the detected scripts to the front of the pending list.
+        """
+        preferred = [language for script in sorted(detected_scripts)
+                     for language in SCRIPT_LANGUAGES.get(script, ()) if language in pending]
+        preferred = list(dict.fromkeys(preferred))
+        return preferred + [language for language in pending if language not in preferred]
+
+    def _process_with_model(self, model, image, language=""):
         """
         Process the image with a specific OCR model.
         """
-        latex_data = model.recognize_text_formula(image, file_type='text_formula', return_text=False)
+        model_slot = self.model_registry.model_slot(language) if self.model_registry is not None and language \
+            else nullcontext()
+        with model_slot, timed("process_with_model", language=language):
+            latex_data = model.recognize_text_formula(image, file_type='text_formula', return_text=False)
         confidence_per_line = Counter()
         line_counts = Counter(entry['line_number'] for entry in latex_data)
         
@@ -144,13 +258,14 @@ class LatexExtractor:
         Detect and remove diagrams from the image.
         """
         try:
-            image = cv2.imread(self.downloaded_file_path)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            edges = cv2.Canny(blurred, 50, 150)
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            with timed("diagram_masking"):
+                image = self.image_context.bgr.copy()
+                gray = self.image_context.gray
+                blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+                edges = cv2.Canny(blurred, 50, 150)
+                contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-            self._filter_and_mask_contours(image, contours)
+                self._filter_and_mask_contours(image, contours)
             logging.info(f"Diagram detection completed.")
 
         except Exception as e:
@@ -166,21 +281,34 @@ class LatexExtractor:
                 if 0.3 < float(w) / h < 3.0:
                     cv2.rectangle(image, (x, y), (x + w, y + h), (255, 255, 255), -1)
                     self.is_diagram = True
-        cv2.imwrite(self.downloaded_file_path, image)
+        self.image_context.replace_bgr(image)
 
     def _detect_is_handwritten(self, request_id):
         """
         Detect if the text is handwritten using a classifier.
         """
         try:
-            img = self._load_image()
-            tgc = TypegroupsClassifier.load(os.path.join('ocrd_typegroups_classifier', 'models', 'classifier.tgc'))
-            result = tgc.classify(img, 75, 64, False)
+            with timed("handwriting_detection"):
+                img = self.image_context.downscaled(1000)
+                tgc = CLASSIFIER_REGISTRY.get(HANDWRITING_CLASSIFIER_MODEL_PATH)
+                patch_stats = {}
+                result = tgc.classify(img, 75, 64, False,
+                                      fully_convolutional=HANDWRITING_CLASSIFIER_FULLY_CONVOLUTIONAL,
+                                      skip_blank=HANDWRITING_MIN_INK_DENSITY is not None,
+                                      min_ink_density=HANDWRITING_MIN_INK_DENSITY or 0,
+                                      max_patches=HANDWRITING_MAX_PATCHES, stats=patch_stats)
+            HANDWRITING_PATCHES.inc(patch_stats["patches_evaluated"], outcome="evaluated")
+            HANDWRITING_PATCHES.inc(max(patch_stats["patches_total"] - patch_stats["patches_evaluated"], 0),
+                                    outcome="skipped")
+            logging.info(f"Handwriting detection classified {patch_stats['patches_evaluated']} of "
+                         f"{patch_stats['patches_total']} patches.")
 
             normalized_result = self._normalize_classifier_result(result)
             return normalized_result['handwritten'] > normalized_result['printed']
-        except Exception:
-            logging.error(f"Handwritten or printed not detected.")
+        except Exception as e:
+            logging.error(f"Handwritten or printed not detected: {str(e)}")
+            # The failure may be transient (e.g. the classifier being replaced): the guess must not be cached
+            skip_caching("handwriting detection failed")
             return False
 
     @staticmethod
@@ -193,6 +321,6 @@ class LatexExtractor:
 
     def _load_image(self):
         """
-        Load and return the image as RGB.
+        Return the image as RGB.
         """
-        return Image.open(self.downloaded_file_path).convert('RGB')
+        return self.image_context.rgb
@@ -0,0 +1,123 @@
+"""
+Title: Script classifier
+Author: Trojan
+Date: 17-10-2026
+"""
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import pytesseract
+from PIL import Image
+
+from utilities.config import LOGGING_LEVEL, SCRIPT_LANGUAGES, SCRIPT_OCR_LANGUAGES, SCRIPT_OCR_MAX_WIDTH, \
+    SCRIPT_MIN_CHARACTERS
+from utilities.general_utils import setup_logging
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+
+def character_script(character: str) -> Optional[str]:
+    """
+    Return the script of a character (a key of SCRIPT_LANGUAGES), or None for digits, punctuation and symbols.
+    """
+    code_point = ord(character)
+    if 0xAC00 <= code_point <= 0xD7AF or 0x1100 <= code_point <= 0x11FF or 0x3130 <= code_point <= 0x318F:
+        return "Hangul"
+    if 0x3040 <= code_point <= 0x30FF or 0x31F0 <= code_point <= 0x31FF:
+        return "Kana"
+    if 0x4E00 <= code_point <= 0x9FFF or 0x3400 <= code_point <= 0x4DBF:
+        return "Han"
+    if code_point < 0x250 and character.isalpha():
+        return "Latin"
+    return None
+
+
+class ScriptClassifier:
+    """
+    Predicts the script of an image (Latin, Hangul, Kana or Han) without a trained model.
+
+    A quick Tesseract pass reads the downscaled image with the language data of every script, and each recognized
+    letter votes for the script of its Unicode block. Japanese text mixes Kana with Han characters: when Kana
+    makes up at least ``kana_share`` of the CJK characters, the Han characters vote for Kana.
+    """
+
+    def __init__(self, languages: str = SCRIPT_OCR_LANGUAGES, max_width: int = SCRIPT_OCR_MAX_WIDTH,
+                 min_characters: int = SCRIPT_MIN_CHARACTERS, kana_share: float = 0.1):
+        """
+        :param languages: Tesseract languages of the pass, e.g. "eng+kor+jpn+chi_sim".
+        :param max_width: Images wider than this are downscaled before the pass.
+        :param min_characters: Minimum number of letters recognized to predict a script.
+        :param kana_share: Share of Kana among the CJK characters from which the text is taken as Japanese.
+        """
+        self.languages = languages
+        self.max_width = max_width
+        self.min_characters = min_characters
+        self.kana_share = kana_share
+
+    def predict(self, pil_image: Image.Image) -> dict:
+        """
+        Predict the script of an image.
+
+        :return: Dictionary with the predicted script (None if too few letters were recognized), the share of the
+                 votes of every script, the number of letters voting and the elapsed time in milliseconds.
+        """
+        start_time = time.perf_counter()
+        if pil_image.size[0] > self.max_width:
+            pil_image = pil_image.resize(
+                (self.max_width, round(pil_image.size[1] * float(self.max_width) / pil_image.size[0])),
+                Image.BILINEAR
+            )
+        text = pytesseract.image_to_string(pil_image.convert('L'), lang=self.languages)
+
+        votes = self.vote(text)
+        characters = sum(votes.values())
+        scores = {script: round(count / characters, 7) for script, count in votes.items()} \
+            if characters >= self.min_characters else {}
+
+        return {
+            "prediction": max(scores, key=scores.get) if scores else None,
+            "scores": scores,
+            "characters": characters,
+            "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 3)
+        }
+
+    def vote(self, text: str) -> Counter:
+        """
+        Count the letters of each script in a piece of text, the Han characters of Japanese text counting as Kana.
+        """
+        votes = Counter(script for script in map(character_script, text) if script is not None)
+        if votes["Kana"] and votes["Kana"] >= self.kana_share * (votes["Kana"] + votes["Han"]):
+            votes["Kana"] += votes.pop("Han", 0)
+        return +votes
+
+    @staticmethod
+    def route(scores: Dict[str, float], max_models: int = 2) -> List[str]:
+        """
+        Return the languages of the most likely scripts, most likely first.
+        """
+        languages = []
+        for script in sorted(scores, key=scores.get, reverse=True):
+            for language in SCRIPT_LANGUAGES.get(script, ()):
+                if language not in languages:
+                    languages.append(language)
+        return languages[:max_models]
+
+
+def load_script_classifier(languages: str = SCRIPT_OCR_LANGUAGES) -> Optional[ScriptClassifier]:
+    """
+    Check that Tesseract and the language data of the script pass are installed, returning None otherwise so that
+    routing is skipped.
+    """
+    try:
+        installed = set(pytesseract.get_languages(config=""))
+        missing = [language for language in languages.split("+") if language not in installed]
+        if missing:
+            raise ValueError(f"Tesseract language data missing: {', '.join(missing)}")
+        logging.info("Script classifier initialized.")
+        return ScriptClassifier(languages)
+    except Exception as e:
+        logging.warning(f"Script classifier not available, auto mode routing disabled: {str(e)}")
+        return None
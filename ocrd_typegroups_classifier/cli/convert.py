@@ -0,0 +1,34 @@
+"""
+Convert a pickled classifier (.tgc) to the safetensors format
+"""
+import sys
+
+import torch
+
+from ..typegroups_classifier import TypegroupsClassifier
+
+def cli():
+    """
+    Run on sys.args
+    """
+    if len(sys.argv) != 3:
+        print('Syntax: %s input.tgc output.safetensors' % sys.argv[0])
+        quit(1)
+    classifier = TypegroupsClassifier.load(sys.argv[1])
+    classifier.save_safetensors(sys.argv[2])
+
+    # Check that the stored network is the one of the pickled classifier
+    converted = TypegroupsClassifier.load_safetensors(sys.argv[2], device='cpu')
+    expected = {name: tensor.cpu() for name, tensor in classifier.network.state_dict().items()}
+    stored = converted.network.state_dict()
+    if expected.keys() != stored.keys() or any(not torch.equal(expected[name], stored[name]) for name in expected):
+        print('Conversion failed: the stored weights differ from %s' % sys.argv[1])
+        quit(1)
+    if converted.classMap.cl2id != classifier.classMap.cl2id:
+        print('Conversion failed: the stored class map differs from %s' % sys.argv[1])
+        quit(1)
+    print('Converted %s to %s (%s, classes: %s)'
+          % (sys.argv[1], sys.argv[2], type(classifier.network).__name__, classifier.classMap))
+
+if __name__ == '__main__':
+    cli()
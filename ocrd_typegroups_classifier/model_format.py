@@ -0,0 +1,250 @@
+""" Pickle-free storage of the classifiers.
+
+    A classifier is stored as a safetensors file: the flat state dict of
+    the network, with the format version, the architecture name and
+    configuration, and the class map in the metadata of the header. The
+    file is memory-mapped when loaded, the tensors of the network being
+    views of the mapped pages: nothing is copied, and the processes
+    loading the same file share the pages of the weights.
+"""
+import json
+import os
+import struct
+
+import torch
+from safetensors.torch import save_file
+
+from ocrd_typegroups_classifier.network.densenet import DenseNet
+from ocrd_typegroups_classifier.network.resnet import ResNet, BasicBlock, Bottleneck
+from ocrd_typegroups_classifier.network.vraec import _VRAEC, _VariationalBasicBlock, _VariationalBottleneck
+
+FORMAT_NAME = 'ocrd_typegroups_classifier'
+FORMAT_VERSION = 1
+
+_DTYPES = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool,
+}
+
+_BLOCKS = {
+    'BasicBlock': BasicBlock,
+    'Bottleneck': Bottleneck,
+    '_VariationalBasicBlock': _VariationalBasicBlock,
+    '_VariationalBottleneck': _VariationalBottleneck,
+}
+
+
+def _densenet_config(network):
+    blocks = [m for name, m in network.features.named_children() if name.startswith('denseblock')]
+    first_layer = blocks[0][0]
+    growth_rate = first_layer.conv2.out_channels
+    return {
+        'growth_rate': growth_rate,
+        'block_config': [len(block) for block in blocks],
+        'num_init_features': network.features.conv0.out_channels,
+        'bn_size': first_layer.conv1.out_channels // growth_rate,
+        'drop_rate': first_layer.drop_rate,
+        'num_classes': network.classifier.out_features,
+    }
+
+
+def _resnet_config(network):
+    if not isinstance(network.bn1, torch.nn.BatchNorm2d):
+        raise ValueError('Only ResNets with BatchNorm2d normalization can be stored')
+    layers = (network.layer1, network.layer2, network.layer3, network.layer4)
+    dilations = [layer[-1].conv2.dilation[0] for layer in layers]
+    return {
+        'block': type(network.layer1[0]).__name__,
+        'layers': [len(layer) for layer in layers],
+        'num_classes': network.fc.out_features,
+        'groups': network.groups,
+        'width_per_group': network.base_width,
+        'replace_stride_with_dilation': [dilations[i + 1] > dilations[i] for i in range(3)],
+    }
+
+
+def _vraec_config(network):
+    return {
+        'block': network.block.__name__,
+        'layers': [len(network.layer1), len(network.layer2), len(network.layer3), len(network.layer4)],
+        'layer_size': list(network.layer_size),
+        'output_channels': network.fc.out_features,
+    }
+
+
+def _build_densenet(config):
+    return DenseNet(growth_rate=config['growth_rate'], block_config=tuple(config['block_config']),
+                    num_init_features=config['num_init_features'], bn_size=config['bn_size'],
+                    drop_rate=config['drop_rate'], num_classes=config['num_classes'])
+
+
+def _build_resnet(config):
+    return ResNet(_BLOCKS[config['block']], config['layers'], num_classes=config['num_classes'],
+                  groups=config['groups'], width_per_group=config['width_per_group'],
+                  replace_stride_with_dilation=config['replace_stride_with_dilation'])
+
+
+def _build_vraec(config):
+    return _VRAEC(_BLOCKS[config['block']], config['layers'], layer_size=tuple(config['layer_size']),
+                  output_channels=config['output_channels'])
+
+
+# Architecture name: (class, function describing an instance, function building an instance)
+ARCHITECTURES = {
+    'DenseNet': (DenseNet, _densenet_config, _build_densenet),
+    'ResNet': (ResNet, _resnet_config, _build_resnet),
+    '_VRAEC': (_VRAEC, _vraec_config, _build_vraec),
+}
+
+
+def describe_network(network):
+    """ Returns the architecture name and configuration of a network
+
+        Parameters
+        ----------
+            network: PyTorch network
+                Instance of one of the ARCHITECTURES
+
+        Returns
+        -------
+            (name, config)
+                Architecture name and JSON-serializable arguments
+                building the same network
+    """
+
+    for name, (network_class, describe, _) in ARCHITECTURES.items():
+        if type(network) is network_class:
+            return name, describe(network)
+    raise ValueError('Unsupported network architecture: %s' % type(network).__name__)
+
+
+def build_network(architecture, config):
+    """ Builds a network from its architecture name and configuration,
+        without initializing its weights (they are on the meta device
+        until a state dict is assigned)
+    """
+
+    if architecture not in ARCHITECTURES:
+        raise ValueError('Unsupported network architecture: %s' % architecture)
+    with torch.device('meta'):
+        return ARCHITECTURES[architecture][2](config)
+
+
+def save(output, network, cl2id, id2cl):
+    """ Stores a network and its class map to a safetensors file
+
+        Parameters
+        ----------
+            output: string
+                Path of the file
+            network: PyTorch network
+                Network to store
+            cl2id, id2cl: dictionaries
+                Class map of the classifier
+    """
+
+    architecture, config = describe_network(network)
+
+    # Modules registered under several names (e.g. the variational
+    # layers of the VRAEC) are stored once, the other names being
+    # aliases restored when loading.
+    tensors = {}
+    aliases = {}
+    seen = {}
+    for name, tensor in network.state_dict().items():
+        key = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tuple(tensor.stride()))
+        if tensor.numel() > 0 and key in seen:
+            aliases[name] = seen[key]
+            continue
+        seen[key] = name
+        tensors[name] = tensor.detach().to('cpu').contiguous()
+
+    metadata = {
+        'format': FORMAT_NAME,
+        'format_version': str(FORMAT_VERSION),
+        'architecture': architecture,
+        'config': json.dumps(config),
+        'cl2id': json.dumps(cl2id),
+        'id2cl': json.dumps({str(cid): cl for cid, cl in id2cl.items()}),
+        'aliases': json.dumps(aliases),
+    }
+    save_file(tensors, output, metadata=metadata)
+
+
+def read_header(path):
+    """ Reads the JSON header of a safetensors file
+
+        Returns
+        -------
+            (header, data_start)
+                The header and the offset of the tensor data in the file
+    """
+
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    return header, 8 + header_size
+
+
+def load_state_dict(path):
+    """ Memory-maps a safetensors file, returning its tensors as views of
+        the mapped pages, and its metadata
+
+        The mapping is private: the pages are shared with the other
+        processes mapping the file as long as the tensors are not
+        modified.
+    """
+
+    header, data_start = read_header(path)
+    metadata = header.pop('__metadata__', None) or {}
+
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
+
+    state_dict = {}
+    for name, info in header.items():
+        dtype = _DTYPES[info['dtype']]
+        begin, end = info['data_offsets']
+        raw = data[data_start + begin:data_start + end]
+        if (data_start + begin) % dtype.itemsize:
+            # Misaligned tensors (not written by save()) have to be copied
+            raw = raw.clone()
+        state_dict[name] = raw.view(dtype).reshape(info['shape'])
+    return state_dict, metadata
+
+
+def load(path):
+    """ Loads a network and its class map from a safetensors file
+
+        Returns
+        -------
+            (network, cl2id, id2cl)
+                The network in eval mode, on the cpu, and its class map
+    """
+
+    state_dict, metadata = load_state_dict(path)
+    if metadata.get('format') != FORMAT_NAME:
+        raise ValueError('%s is not a %s file' % (path, FORMAT_NAME))
+    version = int(metadata.get('format_version', 0))
+    if version > FORMAT_VERSION:
+        raise ValueError('%s has format version %d, only versions up to %d are supported'
+                         % (path, version, FORMAT_VERSION))
+
+    for alias, name in json.loads(metadata.get('aliases', '{}')).items():
+        state_dict[alias] = state_dict[name]
+
+    network = build_network(metadata['architecture'], json.loads(metadata['config']))
+    network.load_state_dict(state_dict, strict=True, assign=True)
+    network.eval()
+
+    cl2id = json.loads(metadata['cl2id'])
+    id2cl = {int(cid): cl for cid, cl in json.loads(metadata['id2cl']).items()}
+    return network, cl2id, id2cl
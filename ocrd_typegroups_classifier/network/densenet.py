@@ -70,6 +70,9 @@ class DenseNet(nn.Module):
         num_classes (int) - number of classification classes
     """
 
+    # Downsampling factor between the input and the output of features
+    feature_stride = 32
+
     def __init__(self, growth_rate=32, block_config=(6, 12, 24, 16),
                  num_init_features=64, bn_size=4, drop_rate=0, num_classes=1000):
 
@@ -121,6 +124,15 @@ class DenseNet(nn.Module):
         out = self.classifier(out)
         return out
 
+    def feature_map(self, x):
+        """Feature map of an input of any size, whose average over the positions of a patch is the input of the
+        classifier for that patch."""
+        return F.relu(self.features(x))
+
+    def classify_features(self, features):
+        """Classification scores of pooled feature vectors (N, C)."""
+        return self.classifier(features)
+
 
 def _load_state_dict(model, model_url, progress):
     # '.'s are no longer allowed in module names, but previous _DenseLayer
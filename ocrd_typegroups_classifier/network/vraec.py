@@ -96,6 +96,9 @@ class _VariationalBottleneck(nn.Module):
 
 class _VRAEC(nn.Module):
 
+    # Downsampling factor between the input and the output of layer4
+    feature_stride = 32
+
     def __init__(self, block, layers, layer_size=64, output_channels=256):
         self.inplanes = 64
         super(_VRAEC, self).__init__()
@@ -211,6 +214,23 @@ class _VRAEC(nn.Module):
 
         return x, vl, ap.detach()
     
+    def feature_map(self, x):
+        """ Runs the convolutional part of the network on an input of
+            any size, returning the output of layer4: averaged over the
+            positions covered by a 224x224 patch, it is the input of fc
+            for that patch """
+        x = self.relu(self.conv1(x))
+        x = self.maxpool(x)
+        x = self.layer1(x)
+        x = self.layer2(x)
+        x = self.layer3(x)
+        x = self.layer4(x)
+        return x
+    
+    def classify_features(self, features):
+        """ Classification scores of pooled feature vectors (N, C) """
+        return self.fc(features)
+    
     def encode(self, x, nb_layers):
         px = x
         x = self.relu(self.conv1(x))
@@ -6,6 +6,7 @@ from PIL import Image
 
 from ocrd_typegroups_classifier.data.classmap import ClassMap
 from ocrd_typegroups_classifier.data.classmap import IndexRemap
+from ocrd_typegroups_classifier import model_format
 
 
 
@@ -62,10 +63,13 @@ class TypegroupsClassifier:
             ----------
             input: string or file
                 File or path to the file from which the instance has to
-                be loaded.
+                be loaded; paths ending with .safetensors are loaded
+                with load_safetensors().
         
         """
         
+        if type(input) is str and input.endswith('.safetensors'):
+            return cls.load_safetensors(input)
         if type(input) is str:
             f = open(input, 'rb')
             res = cls.load(f)
@@ -79,6 +83,43 @@ class TypegroupsClassifier:
         res.network.to(res.dev)
         return res
         
+    @classmethod
+    def load_safetensors(cls, path, device=None):
+        """ Loads a type groups classifier stored by save_safetensors()
+        
+            The weights are memory-mapped instead of being read and
+            unpickled: loading is nearly instantaneous, and the processes
+            loading the same file share the memory of the weights (as
+            long as the network stays on the cpu).
+            
+            Parameters
+            ----------
+            path: string
+                Path to the file
+            device: str
+                Device on which the data has to be processed; if not set,
+                then either the cpu or cuda:0 will be used.
+        
+        """
+        
+        network, cl2id, id2cl = model_format.load(path)
+        res = cls(cl2id, network, device)
+        res.classMap.id2cl = id2cl
+        return res
+    
+    def save_safetensors(self, output):
+        """ Stores the instance to a safetensors file, readable without
+            unpickling
+        
+            Parameters
+            ----------
+                output: string
+                    Path to the file to which the instance has to be
+                    stored.
+        """
+        
+        model_format.save(output, self.network, self.classMap.cl2id, self.classMap.id2cl)
+    
     def save(self, output):
         """ Stores the instance to a file
         
@@ -124,7 +165,9 @@ class TypegroupsClassifier:
     def run(self, pil_image, stride, batch_size=32, score_as_key=False):
         return self.classify(pil_image, stride, batch_size, score_as_key)
     
-    def classify(self, pil_image, stride, batch_size, score_as_key=False, max_width=1000):
+    def classify(self, pil_image, stride, batch_size, score_as_key=False, max_width=1000, vectorized=True,
+                 fully_convolutional=False, skip_blank=False, min_ink_density=0.002, max_patches=None,
+                 stats=None):
         """ Classifies a PIL image, returning a map with class names and
             corresponding scores.
             
@@ -142,6 +185,37 @@ class TypegroupsClassifier:
                 score_as_key: bool
                     Use scores, instead of class names, as key for the
                     result map.
+                max_width: int
+                    Images wider than this are downscaled first.
+                vectorized: bool
+                    Convert the image to a tensor once and take the
+                    patches as strided views of it, instead of cropping
+                    and converting every patch with PIL; the scores are
+                    identical.
+                fully_convolutional: bool
+                    Run the convolutional part of the network once over
+                    the whole image, and classify every patch from the
+                    average of the feature map over the region it
+                    covers; the cost scales with the image area instead
+                    of the number of overlapping patches. Patches don't
+                    see zero padding at their borders but the
+                    neighbouring pixels, so the scores are close to,
+                    not identical to, the patch-wise ones. Requires a
+                    network with feature_map() and classify_features()
+                    (_VRAEC, DenseNet).
+                skip_blank: bool
+                    Only classify the patches selected by
+                    select_patches(): patches inside the image holding
+                    at least min_ink_density ink, at most max_patches
+                    of them.
+                min_ink_density: float
+                    See select_patches().
+                max_patches: int
+                    See select_patches().
+                stats: dict
+                    If set, receives the number of patches of the grid
+                    (patches_total) and of patches classified
+                    (patches_evaluated).
             
             Returns
             -------
@@ -154,15 +228,40 @@ class TypegroupsClassifier:
             pil_image = pil_image.resize((max_width, round(pil_image.size[1]*float(max_width)/pil_image.size[0])), Image.BILINEAR)
         crop_size = min(224, pil_image.size[0])
         crop_size = min(crop_size, pil_image.size[1])
+        grid = [(x, y) for x in range(0, pil_image.size[0], stride) for y in range(0, pil_image.size[1], stride)]
+        if skip_blank:
+            positions = self.select_patches(pil_image, crop_size, stride, min_ink_density, max_patches)
+        else:
+            positions = grid
+        if stats is not None:
+            stats['patches_total'] = len(grid)
+            stats['patches_evaluated'] = len(positions)
+        
         tensorize = transforms.ToTensor()
         was_training = self.network.training
         self.network.eval()
         with torch.no_grad():
             score = 0
             processed_samples = 0
-            batch = []
-            for x in range(0, pil_image.size[0], stride):
-                for y in range(0, pil_image.size[1], stride):
+            if fully_convolutional:
+                out = self._fully_convolutional_scores(pil_image, crop_size, stride, positions)
+                score += out.sum(0)
+                processed_samples += len(out)
+            elif vectorized:
+                windows = self.extract_patches(pil_image, crop_size, stride)
+                xs = torch.tensor([x for x, _ in positions])
+                ys = torch.tensor([y for _, y in positions])
+                for start in range(0, len(positions), batch_size):
+                    # Same patches, order and batches as the loop below;
+                    # only the batch itself is gathered into new memory
+                    batch = windows[:, ys[start:start+batch_size], xs[start:start+batch_size]]
+                    tensors = batch.transpose(0, 1).contiguous().to(self.dev)
+                    out = self.network(tensors)
+                    score += out.sum(0)
+                    processed_samples += len(tensors)
+            else:
+                batch = []
+                for x, y in positions:
                     crop = tensorize(pil_image.crop((x, y, x+crop_size, y+crop_size)))
                     batch.append(crop)
                     if len(batch) >= batch_size:
@@ -171,12 +270,12 @@ class TypegroupsClassifier:
                         score += out.sum(0)
                         processed_samples += len(batch)
                         batch = []
-            if batch:
-                tensors = torch.stack(batch).to(self.dev)
-                out = self.network(tensors)
-                score += out.sum(0)
-                processed_samples += len(batch)
-                batch = []
+                if batch:
+                    tensors = torch.stack(batch).to(self.dev)
+                    out = self.network(tensors)
+                    score += out.sum(0)
+                    processed_samples += len(batch)
+                    batch = []
         if was_training:
             self.network.train()
         score /= processed_samples
@@ -190,6 +289,140 @@ class TypegroupsClassifier:
             res = {s: c for c, s in res.items()}
         return res
     
+    @staticmethod
+    def select_patches(pil_image, crop_size, stride, min_ink_density=0.002, max_patches=None,
+                       downsampling=4, ink_threshold=32):
+        """ Selects the patches worth classifying
+            
+            Patches are taken on the grid of classify(), but only inside
+            the image: instead of patches crossing the right or bottom
+            border, a patch is aligned with the border. The ink of every
+            patch is measured on a downsampled grayscale view of the
+            image, and the patches with too little ink are skipped.
+            
+            Parameters
+            ----------
+                pil_image: PIL image
+                    Image to classify, after resizing
+                crop_size: int
+                    Side of the square patches
+                stride: int
+                    Offset between two patches
+                min_ink_density: float
+                    Minimum share of ink pixels of a patch; the patch
+                    with the most ink is kept if none has enough.
+                max_patches: int
+                    If set, the selected patches are split in
+                    max_patches groups of neighbouring patches and only
+                    the patch with the most ink of each group is kept;
+                    must be at least 1.
+                downsampling: int
+                    Reduction factor of the grayscale view
+                ink_threshold: int
+                    Pixels of the view darker than the background (its
+                    median) by more than this are ink.
+            
+            Returns
+            -------
+                The (x, y) positions of the selected patches, in the
+                order of classify().
+        """
+        
+        if max_patches is not None and max_patches < 1:
+            raise ValueError('max_patches must be at least 1 (or None for no cap), got %s' % max_patches)
+        width, height = pil_image.size
+        xs = list(range(0, width - crop_size + 1, stride))
+        if xs[-1] != width - crop_size:
+            xs.append(width - crop_size)
+        ys = list(range(0, height - crop_size + 1, stride))
+        if ys[-1] != height - crop_size:
+            ys.append(height - crop_size)
+        positions = [(x, y) for x in xs for y in ys]
+        
+        # Share of ink pixels of every patch, from the integral image of
+        # the ink of the downsampled view
+        gray = transforms.ToTensor()(pil_image.convert('L').reduce(downsampling))[0]
+        ink = (gray < gray.median() - ink_threshold / 255).float()
+        integral = torch.nn.functional.pad(ink.cumsum(0).cumsum(1), (1, 0, 1, 0))
+        view_height, view_width = ink.shape
+        x = torch.tensor([x for x, _ in positions])
+        y = torch.tensor([y for _, y in positions])
+        x0 = x // downsampling
+        y0 = y // downsampling
+        x1 = torch.clamp(-(-(x + crop_size) // downsampling), max=view_width)
+        y1 = torch.clamp(-(-(y + crop_size) // downsampling), max=view_height)
+        ink_pixels = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        density = ink_pixels / ((x1 - x0) * (y1 - y0)).clamp(min=1)
+        
+        selected = [i for i in range(len(positions)) if density[i] >= min_ink_density]
+        if not selected:
+            selected = [int(density.argmax())]
+        if max_patches is not None and len(selected) > max_patches:
+            strata = torch.tensor(selected).tensor_split(max_patches)
+            selected = [int(stratum[density[stratum].argmax()]) for stratum in strata]
+        return [positions[i] for i in selected]
+    
+    @staticmethod
+    def extract_patches(pil_image, crop_size, stride):
+        """ Returns every patch of the image as a view of the image tensor
+            
+            Parameters
+            ----------
+                pil_image: PIL image
+                    Image to cut into patches
+                crop_size: int
+                    Side of the square patches
+                stride: int
+                    Offset between the patches of classify(), used to
+                    pad the image
+            
+            Returns
+            -------
+                A tensor of shape (channels, height, width, crop_size,
+                crop_size) without copy of the image, the patch at
+                [:, y, x] being the crop at (x, y); as with PIL crops,
+                patches crossing the right or bottom border are padded
+                with zeros.
+        """
+        
+        image = TypegroupsClassifier._padded_tensor(pil_image, crop_size, stride)
+        return image.unfold(1, crop_size, 1).unfold(2, crop_size, 1)
+    
+    @staticmethod
+    def _padded_tensor(pil_image, crop_size, stride):
+        """ Converts the image to a tensor, padded with zeros on the right
+            and bottom so that it contains every patch of classify() """
+        
+        image = transforms.ToTensor()(pil_image)
+        height, width = image.shape[1:]
+        pad_right = max((width - 1) // stride * stride + crop_size - width, 0)
+        pad_bottom = max((height - 1) // stride * stride + crop_size - height, 0)
+        if pad_right or pad_bottom:
+            image = torch.nn.functional.pad(image, (0, pad_right, 0, pad_bottom))
+        return image
+    
+    def _fully_convolutional_scores(self, pil_image, crop_size, stride, positions):
+        """ Returns the network output of the patches at the given
+            positions, computed from a single feature map of the whole
+            image """
+        
+        if not hasattr(self.network, 'feature_map'):
+            raise ValueError('%s does not support fully convolutional inference' % type(self.network).__name__)
+        image = self._padded_tensor(pil_image, crop_size, stride)
+        features = self.network.feature_map(image.unsqueeze(0).to(self.dev))
+        feature_stride = self.network.feature_stride
+        height, width = features.shape[2:]
+        
+        # Average of every window of the feature map covering a patch
+        window = min(max(round(crop_size / feature_stride), 1), height, width)
+        pooled = torch.nn.functional.avg_pool2d(features, window, stride=1)[0]
+        
+        columns = torch.tensor([min(round(x / feature_stride), width - window) for x, _ in positions],
+                               device=features.device)
+        rows = torch.tensor([min(round(y / feature_stride), height - window) for _, y in positions],
+                            device=features.device)
+        return self.network.classify_features(pooled[:, rows, columns].t())
+    
     def __repr__(self):
         """ returns a string description of the instance """
         
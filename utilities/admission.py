@@ -0,0 +1,129 @@
+"""
+Title: Admission control
+Author: Trojan
+Date: 17-10-2026
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+
+from utilities.custom_exception import CustomExceptionAndLog
+
+
+class OverloadedError(CustomExceptionAndLog):
+    """Request rejected because the server is at capacity, to be retried after ``retry_after`` seconds."""
+
+    def __init__(self, error_code: str, error_message: str, retry_after: int):
+        super().__init__(error_code, error_message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the requests processed at once and the requests waiting for them.
+
+    Up to ``max_concurrent`` requests run at once and up to ``max_queued`` more wait, in arrival order, for one
+    of them to finish. A request arriving when the queue is full, or waiting longer than
+    ``queue_timeout_seconds``, is rejected with an OverloadedError instead of piling up until the client times
+    out, which keeps the latency of the admitted requests bounded under overload.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout_seconds: float, retry_after_seconds: int):
+        """
+        :param max_concurrent: Maximum number of requests processed at once.
+        :param max_queued: Maximum number of requests waiting for a slot.
+        :param queue_timeout_seconds: Maximum time a request waits for a slot.
+        :param retry_after_seconds: Delay suggested to the rejected clients.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+
+        self.running = 0
+        self.queued = 0
+        self.stats = Counter()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a processing slot, waiting in the queue if needed; raise an OverloadedError if rejected."""
+        with self._condition:
+            # Requests don't overtake the queue, even if a slot was just released.
+            if self.running < self.max_concurrent and self.queued == 0:
+                self._admit()
+                return
+            if self.queued >= self.max_queued:
+                self.stats["rejected"] += 1
+                raise self._overloaded("E_OCR_026", f"Server overloaded: {self.queued} requests already queued")
+
+            self.queued += 1
+            self.stats["queued"] += 1
+            deadline = time.monotonic() + self.queue_timeout_seconds
+            try:
+                while self.running >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timed_out"] += 1
+                        raise self._overloaded(
+                            "E_OCR_027", f"No processing slot available within {self.queue_timeout_seconds} seconds"
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self.queued -= 1
+            self._admit()
+
+    def release(self):
+        """Give back a processing slot taken with acquire."""
+        with self._condition:
+            self.running -= 1
+            self._condition.notify()
+
+    def _admit(self):
+        self.running += 1
+        self.stats["admitted"] += 1
+
+    def _overloaded(self, error_code: str, error_message: str) -> OverloadedError:
+        return OverloadedError(error_code, error_message, self.retry_after_seconds)
+
+
+class AsyncAdmissionController(AdmissionController):
+    """AdmissionController for the requests of an event loop: waiting for a slot doesn't block the loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_condition = None
+
+    async def acquire_async(self):
+        """Take a processing slot, waiting in the queue if needed; raise an OverloadedError if rejected."""
+        if self._async_condition is None:
+            self._async_condition = asyncio.Condition()
+        condition = self._async_condition
+        async with condition:
+            if self.running < self.max_concurrent and self.queued == 0:
+                self._admit()
+                return
+            if self.queued >= self.max_queued:
+                self.stats["rejected"] += 1
+                raise self._overloaded("E_OCR_026", f"Server overloaded: {self.queued} requests already queued")
+
+            self.queued += 1
+            self.stats["queued"] += 1
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.running < self.max_concurrent), self.queue_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                raise self._overloaded(
+                    "E_OCR_027", f"No processing slot available within {self.queue_timeout_seconds} seconds"
+                )
+            finally:
+                self.queued -= 1
+            self._admit()
+
+    async def release_async(self):
+        """Give back a processing slot taken with acquire_async."""
+        async with self._async_condition:
+            self.running -= 1
+            self._async_condition.notify()
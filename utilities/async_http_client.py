@@ -0,0 +1,55 @@
+"""
+Title: Async HTTP client
+Author: Trojan
+Date: 17-10-2026
+"""
+import asyncio
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utilities.config import DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT, DOWNLOAD_TOTAL_TIMEOUT, \
+    DOWNLOAD_MAX_BYTES, DOWNLOAD_CHUNK_SIZE, ASYNC_DOWNLOAD_CONNECTIONS
+from utilities.custom_exception import CustomExceptionAndLog
+from utilities.metrics import timed
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Create the session of the event loop, with the same timeouts as the synchronous downloads."""
+    timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TOTAL_TIMEOUT, sock_connect=DOWNLOAD_CONNECT_TIMEOUT,
+                                    sock_read=DOWNLOAD_READ_TIMEOUT)
+    return aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=ASYNC_DOWNLOAD_CONNECTIONS))
+
+
+async def download_image_bytes(session: aiohttp.ClientSession, image_url: str) -> bytes:
+    """
+    Stream an image into memory without blocking the event loop, raising a CustomExceptionAndLog carrying the error code
+    on failure (same codes as the synchronous downloads).
+    """
+    parsed_url = urlparse(image_url or "")
+    if not (parsed_url.scheme and parsed_url.netloc):
+        raise CustomExceptionAndLog("E_OCR_011", "Invalid URL format")
+
+    try:
+        with timed("download"):
+            return await _read_image_bytes(session, image_url)
+    except CustomExceptionAndLog:
+        raise
+    except asyncio.TimeoutError:
+        raise CustomExceptionAndLog("E_OCR_022", f"Image download exceeded {DOWNLOAD_TOTAL_TIMEOUT} seconds")
+    except Exception as e:
+        raise CustomExceptionAndLog("E_OCR_010", f"Error with exception: {str(e)}")
+
+
+async def _read_image_bytes(session: aiohttp.ClientSession, image_url: str) -> bytes:
+    async with session.get(image_url) as response:
+        response.raise_for_status()
+        if response.content_length is not None and response.content_length > DOWNLOAD_MAX_BYTES:
+            raise CustomExceptionAndLog("E_OCR_021", f"Image exceeds the maximum size of {DOWNLOAD_MAX_BYTES} bytes")
+
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > DOWNLOAD_MAX_BYTES:
+                raise CustomExceptionAndLog("E_OCR_021", f"Image exceeds the maximum size of {DOWNLOAD_MAX_BYTES} bytes")
+        return bytes(buffer)
@@ -0,0 +1,201 @@
+"""
+Title: Batch processor
+Author: Trojan
+Date: 17-10-2026
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utilities.config import LOGGING_LEVEL, BATCH_MAX_ITEMS, BATCH_DOWNLOAD_WORKERS, BATCH_DECODE_WORKERS, \
+    BATCH_INFERENCE_WORKERS, BATCH_STREAM_WINDOW
+from utilities.core_utils import generate_request_id, parse_request_data, parse_form_data, process_image
+from utilities.custom_exception import CustomExceptionAndLog
+from utilities.general_utils import save_image_bytes, setup_logging
+from utilities.http_client import check_url_and_download_image
+from utilities.image_context import ImageContext
+from utilities.request_context import RequestContext, RequestOptions
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+
+@dataclass
+class BatchItem:
+    """
+    One image of a batch, given either by its URL (in context.options.image_url) or by its bytes.
+    """
+    index: int
+    context: object
+    image_bytes: Optional[bytes] = None
+    error_code: str = "E_OCR_006"
+
+
+def parse_batch_items(request, app) -> List[BatchItem]:
+    """
+    Build the items of a batch request: a JSON body whose "src" is a list of image URLs, or a multipart form with
+    several "file" parts. The other fields are the options of a single conversion and apply to every image.
+    """
+    if request.files:
+        files = request.files.getlist('file')
+        _check_batch_size(len(files))
+        options = RequestOptions.from_request_data(parse_form_data(request))
+        items = []
+        for index, file in enumerate(files):
+            context = RequestContext(generate_request_id(), options)
+            image_bytes = file.read()
+            save_image_bytes(image_bytes, context.request_id, app)
+            items.append(BatchItem(index, context, image_bytes=image_bytes, error_code="E_OCR_009"))
+        return items
+
+    request_data = parse_request_data(request)
+    sources = request_data.get("src") or []
+    if isinstance(sources, str):
+        sources = [sources]
+    _check_batch_size(len(sources))
+    return [
+        BatchItem(index, RequestContext(generate_request_id(), RequestOptions.from_request_data(dict(request_data,
+                                                                                                     src=source))))
+        for index, source in enumerate(sources)
+    ]
+
+
+def _check_batch_size(size: int):
+    if size == 0:
+        raise CustomExceptionAndLog("E_OCR_023", "No image in batch")
+    if size > BATCH_MAX_ITEMS:
+        raise CustomExceptionAndLog("E_OCR_024", f"Batch exceeds the maximum of {BATCH_MAX_ITEMS} images")
+
+
+class BatchProcessor:
+    """
+    Pipelines the images of a batch through download, decode and inference.
+
+    Each stage runs on its own pool, so the downloads of some images overlap the decoding and the recognition of
+    others. The inference pool runs several images at once, letting the formula recognition micro-batcher group
+    their crops. Each image takes its own admission slot while it is recognized, so a batch counts as many
+    requests as it has images in inference. An image failing at any stage (or rejected by the admission control)
+    results in an error response for that image only.
+    """
+
+    def __init__(self, app, download_workers: int = BATCH_DOWNLOAD_WORKERS, decode_workers: int = BATCH_DECODE_WORKERS,
+                 inference_workers: int = BATCH_INFERENCE_WORKERS):
+        """
+        :param app: Flask app holding the models.
+        :param download_workers: Number of concurrent downloads.
+        :param decode_workers: Number of concurrent image decodings.
+        :param inference_workers: Number of images recognized concurrently.
+        """
+        self.app = app
+        self._workers = {"download": download_workers, "decode": decode_workers, "inference": inference_workers}
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def process(self, items: List[BatchItem]) -> List[dict]:
+        """Return the response of every item, in the order of the items."""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def iter_completed(self, items: Iterable[BatchItem], window: int = BATCH_STREAM_WINDOW) \
+            -> Iterator[Tuple[BatchItem, dict]]:
+        """
+        Yield (item, response) pairs as the items complete, in completion order.
+
+        At most ``window`` items are in flight: a new item is only started when a response is taken from the
+        generator. When the generator is consumed by a streamed response, a slow client therefore slows down the
+        processing instead of letting the responses pile up in memory.
+        """
+        completed = queue.Queue()
+        pending = iter(items)
+
+        def start(item: BatchItem):
+            self.submit(item).add_done_callback(lambda future: completed.put((item, future.result())))
+
+        in_flight = 0
+        for item in islice(pending, window):
+            start(item)
+            in_flight += 1
+
+        while in_flight:
+            item, response_dict = completed.get()
+            in_flight -= 1
+            next_item = next(pending, None)
+            if next_item is not None:
+                start(next_item)
+                in_flight += 1
+            yield item, response_dict
+
+    def submit(self, item: BatchItem) -> Future:
+        """
+        Start processing an item; the returned future resolves to its response (never to an exception).
+        """
+        result = Future()
+        stages = [
+            ("decode", ImageContext),
+            ("inference", lambda image_context: self._infer(item, image_context)),
+        ]
+        if item.image_bytes is None:
+            self._run_stage(item, "download", lambda _: check_url_and_download_image(item.context, self.app),
+                            None, stages, result)
+        else:
+            self._run_stage(item, *stages[0], item.image_bytes, stages[1:], result)
+        return result
+
+    def _infer(self, item: BatchItem, image_context: ImageContext) -> dict:
+        item.context = item.context.with_image_size(image_context.size)
+        admission = getattr(self.app, "admission", None)
+        if admission is None:
+            return process_image(image_context, self.app, item.context)
+
+        admission.acquire()
+        try:
+            return process_image(image_context, self.app, item.context)
+        finally:
+            admission.release()
+
+    def _run_stage(self, item: BatchItem, name: str, function: Callable, value, remaining: list, result: Future):
+        try:
+            future = self._executor(name).submit(function, value)
+        except Exception as e:
+            result.set_result(self._error_response(item, e))
+            return
+        future.add_done_callback(lambda done: self._on_stage_done(item, done, remaining, result))
+
+    def _on_stage_done(self, item: BatchItem, future: Future, remaining: list, result: Future):
+        error = future.exception()
+        if error is not None:
+            result.set_result(self._error_response(item, error))
+        elif remaining:
+            self._run_stage(item, *remaining[0], future.result(), remaining[1:], result)
+        else:
+            result.set_result(future.result())
+
+    def _error_response(self, item: BatchItem, error: BaseException) -> dict:
+        if isinstance(error, CustomExceptionAndLog):
+            error_dict = error.error_dict
+        else:
+            error_dict = {"code": item.error_code, "message": str(error)}
+            logging.error(error_dict)
+        response_dict = {
+            "status": 0,
+            "request_id": item.context.request_id,
+            "version": self.app.api_version,
+            "image_width": item.context.image_width,
+            "image_height": item.context.image_height,
+            "error": error_dict
+        }
+        if item.image_bytes is None:
+            response_dict["url"] = item.context.options.image_url
+        return response_dict
+
+    def _executor(self, name: str) -> ThreadPoolExecutor:
+        # Created on first use so that no thread is started before the server forks its workers.
+        with self._lock:
+            if name not in self._executors:
+                self._executors[name] = ThreadPoolExecutor(max_workers=self._workers[name],
+                                                           thread_name_prefix=f"batch-{name}")
+            return self._executors[name]
@@ -0,0 +1,178 @@
+"""
+Title: Micro-batching
+Author: Trojan
+Date: 17-10-2026
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from utilities.config import LOGGING_LEVEL
+from utilities.general_utils import setup_logging
+from utilities.metrics import REGISTRY, Counter, Gauge
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+_batchers = weakref.WeakSet()
+
+
+def _collect(attribute: str):
+    values = {}
+    for batcher in list(_batchers):
+        values[(batcher.name,)] = values.get((batcher.name,), 0) + getattr(batcher, attribute)
+    return list(values.items())
+
+
+REGISTRY.register(Gauge("formula_ocr_batcher_queue_depth", "Items waiting for a batch.", ("batcher",),
+                        function=lambda: _collect("queue_depth")))
+REGISTRY.register(Counter("formula_ocr_batcher_batches_total", "Batches processed.", ("batcher",),
+                          function=lambda: _collect("batches")))
+REGISTRY.register(Counter("formula_ocr_batcher_items_total", "Items processed in batches.", ("batcher",),
+                          function=lambda: _collect("batched_items")))
+
+
+class _PendingCall:
+    """Items submitted by one caller, waiting to be part of a batch."""
+
+    def __init__(self, items: list, kwargs: dict):
+        self.items = items
+        self.kwargs = kwargs
+        self.kwargs_key = repr(sorted(kwargs.items()))
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    Groups the items submitted by concurrent callers into batches.
+
+    A batch is processed as soon as it holds ``max_batch_size`` items or ``max_wait_ms`` after its first item
+    arrived. Only calls made with the same keyword arguments are batched together. Each caller receives the
+    results of its own items, in order.
+    """
+
+    def __init__(self, process_batch: Callable[..., list], max_batch_size: int, max_wait_ms: float,
+                 name: str = "batcher"):
+        """
+        :param process_batch: Callable receiving the list of items and the shared keyword arguments,
+                              returning one result per item.
+        :param max_batch_size: Maximum number of items per batch.
+        :param max_wait_ms: Maximum time the first item of a batch waits for other items.
+        :param name: Name of the worker thread.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+
+        self.batches = 0
+        self.batched_items = 0
+        _batchers.add(self)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of items waiting for a batch."""
+        with self._condition:
+            return sum(len(pending.items) for pending in self._queue)
+
+    def submit(self, items: list, **kwargs) -> list:
+        """
+        Queue the items for the next batch and wait for their results.
+        """
+        if not items:
+            return []
+        pending = _PendingCall(list(items), kwargs)
+        with self._condition:
+            self._ensure_worker()
+            self._queue.append(pending)
+            self._condition.notify()
+        return pending.future.result()
+
+    def _ensure_worker(self):
+        # Threads don't survive a fork, so every (pre-forked) worker process starts its own.
+        if self._worker is None or not self._worker.is_alive() or self._worker_pid != os.getpid():
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self._process(batch)
+
+    def _next_batch(self) -> List[_PendingCall]:
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+
+            deadline = time.monotonic() + self.max_wait_seconds
+            while self._matching_items(self._queue[0].kwargs_key) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            kwargs_key = self._queue[0].kwargs_key
+            batch, size = [], 0
+            for pending in list(self._queue):
+                if pending.kwargs_key != kwargs_key:
+                    continue
+                if batch and size + len(pending.items) > self.max_batch_size:
+                    break
+                batch.append(pending)
+                size += len(pending.items)
+                self._queue.remove(pending)
+            return batch
+
+    def _matching_items(self, kwargs_key: str) -> int:
+        return sum(len(pending.items) for pending in self._queue if pending.kwargs_key == kwargs_key)
+
+    def _process(self, batch: List[_PendingCall]):
+        items = [item for pending in batch for item in pending.items]
+        try:
+            results = self.process_batch(items, **batch[0].kwargs)
+        except Exception as e:
+            logging.error(f"Batch of {len(items)} items failed in {self.name} with error: {str(e)}")
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.batched_items += len(items)
+        offset = 0
+        for pending in batch:
+            pending.future.set_result(results[offset:offset + len(pending.items)])
+            offset += len(pending.items)
+
+
+class BatchedRecognizer:
+    """
+    Proxy sending the ``recognize`` calls of a recognizer (e.g. the formula recognizer) through a MicroBatcher,
+    so that crops coming from concurrent requests are recognized together.
+    """
+
+    def __init__(self, model: Any, max_batch_size: int, max_wait_ms: float, name: str = "mfr-batcher"):
+        self._model = model
+        self.batcher = MicroBatcher(self._recognize_batch, max_batch_size, max_wait_ms, name=name)
+
+    def __getattr__(self, item):
+        return getattr(self._model, item)
+
+    def recognize(self, images, batch_size: Optional[int] = None, **kwargs):
+        # The per-call batch size is replaced by the batcher's maximum batch size.
+        if not isinstance(images, (list, tuple)):
+            return self._model.recognize(images, **kwargs)
+        return self.batcher.submit(list(images), **kwargs)
+
+    def _recognize_batch(self, images: list, **kwargs) -> list:
+        return self._model.recognize(images, batch_size=self.batcher.max_batch_size, **kwargs)
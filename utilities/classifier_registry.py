@@ -0,0 +1,143 @@
+"""
+Title: Classifier registry
+Author: Trojan
+Date: 17-10-2026
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from ocrd_typegroups_classifier.typegroups_classifier import TypegroupsClassifier
+from utilities.config import LOGGING_LEVEL, CLASSIFIER_RELOAD_CHECK_SECONDS
+from utilities.general_utils import setup_logging
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+
+class _Entry:
+    def __init__(self, classifier: TypegroupsClassifier, source: str, mtime: float, load_seconds: float):
+        self.classifier = classifier
+        self.source = source
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.checked_at = time.monotonic()
+
+
+class ClassifierRegistry:
+    """
+    Process-wide TypegroupsClassifier instances, keyed by model file.
+
+    Each file is loaded once, put in eval mode and the same instance is handed to every request. When the file is
+    modified (checked at most every ``reload_check_seconds``), the request noticing it loads it again while the
+    other requests keep using the previous instance, which is also kept if the new file can't be loaded.
+
+    A .safetensors file which doesn't exist yet falls back to the pickled .tgc file beside it, until it is converted.
+    """
+
+    def __init__(self, reload_check_seconds: Optional[float] = CLASSIFIER_RELOAD_CHECK_SECONDS, max_events: int = 100):
+        """
+        :param reload_check_seconds: Minimum time between two checks of the model files, never reloaded if None.
+        :param max_events: Number of load events kept in ``events``.
+        """
+        self.reload_check_seconds = reload_check_seconds
+
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+        self.events = deque(maxlen=max_events)
+        self.stats = Counter()
+
+    def get(self, model_path: str) -> TypegroupsClassifier:
+        """
+        Return the classifier stored in the file, loading it on first use or when the file changed.
+        """
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            entry = self._entries.get(model_path)
+            load_lock = self._load_locks.setdefault(model_path, threading.Lock())
+
+        if entry is None:
+            # Only one thread loads a given file, the others wait for it.
+            with load_lock:
+                with self._lock:
+                    entry = self._entries.get(model_path)
+                if entry is None:
+                    entry = self._load(model_path, reason="load")
+            return entry.classifier
+
+        if self._should_check(entry) and load_lock.acquire(blocking=False):
+            try:
+                entry.checked_at = time.monotonic()
+                # The file may be briefly missing while it is replaced: the loaded instance is kept meanwhile
+                try:
+                    source = self._resolve(model_path)
+                    if source != entry.source or self._mtime(source) != entry.mtime:
+                        entry = self._load(model_path, reason="reload")
+                except Exception as e:
+                    self.stats["reload_failures"] += 1
+                    logging.warning(f"Reloading classifier {model_path} failed, keeping the loaded one: {str(e)}")
+            finally:
+                load_lock.release()
+        self.stats["hits"] += 1
+        return entry.classifier
+
+    def preload(self, model_path: str) -> bool:
+        """Load a classifier ahead of the first request, returning whether it could be loaded."""
+        try:
+            self.get(model_path)
+            return True
+        except Exception as e:
+            logging.error(f"Classifier {model_path} not available: {str(e)}")
+            return False
+
+    def load_seconds(self) -> Dict[str, float]:
+        """Load time of every loaded classifier, by model file."""
+        with self._lock:
+            return {model_path: entry.load_seconds for model_path, entry in self._entries.items()}
+
+    def _should_check(self, entry: _Entry) -> bool:
+        return self.reload_check_seconds is not None \
+            and time.monotonic() - entry.checked_at >= self.reload_check_seconds
+
+    def _load(self, model_path: str, reason: str) -> _Entry:
+        source = self._resolve(model_path)
+        if source != model_path:
+            logging.warning(f"Classifier {model_path} not found, loading {source} instead; convert it with "
+                            f"python -m ocrd_typegroups_classifier.cli.convert {source} {model_path}")
+        mtime = self._mtime(source)
+        start_time = time.perf_counter()
+        classifier = TypegroupsClassifier.load(source)
+        classifier.network.eval()
+        load_seconds = time.perf_counter() - start_time
+
+        entry = _Entry(classifier, source, mtime, load_seconds)
+        with self._lock:
+            self._entries[model_path] = entry
+        self.stats[reason + "s"] += 1
+
+        event_dict = {"event": reason, "model_path": model_path, "source": source, "time": time.time(),
+                      "load_seconds": round(load_seconds, 3)}
+        self.events.append(event_dict)
+        logging.info(f"Classifier registry {reason}: {event_dict}")
+        return entry
+
+    @staticmethod
+    def _resolve(model_path: str) -> str:
+        """Return the file to load for the model path: the .tgc file beside a .safetensors file not converted yet."""
+        if model_path.endswith(".safetensors") and not os.path.exists(model_path):
+            pickled_path = model_path[:-len(".safetensors")] + ".tgc"
+            if os.path.exists(pickled_path):
+                return pickled_path
+        return model_path
+
+    @staticmethod
+    def _mtime(model_path: str) -> float:
+        return os.stat(model_path).st_mtime
+
+
+CLASSIFIER_REGISTRY = ClassifierRegistry()
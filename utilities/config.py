@@ -4,6 +4,7 @@ Author: Trojan
 Date: 25-06-2024
 """
 import logging
+import os
 
 # API Version
 API_VERSION = "1.0"
@@ -13,3 +14,148 @@ DOWNLOADED_IMAGE_PATH = "downloaded_images"
 
 # Logging Configuration
 LOGGING_LEVEL = logging.DEBUG
+
+# Pix2Text language models (language key -> Pix2Text text languages)
+LANGUAGE_CODES = {
+    "ENGLISH": ('en',),
+    "KOREAN": ('en', 'ko'),
+    "JAPANESE": ('en', 'ja'),
+    "CHINESE_SIM": ('en', 'ch_sim'),
+    "CHINESE_TRA": ('en', 'ch_tra'),
+}
+
+# Languages loaded at startup, the others are loaded on first use
+PRELOADED_LANGUAGES = ("ENGLISH",)
+
+# Maximum number of resident language models (None for no limit)
+MAX_RESIDENT_MODELS = 5
+
+# Memory budget in MB for the resident language models, host RSS and CUDA memory together (None for no limit)
+MODEL_MEMORY_BUDGET_MB = None
+
+# Share the layout, formula detection and formula recognition models between all languages
+SHARE_FORMULA_MODELS = True
+
+# Device of the shared models (None lets Pix2Text select cuda when available)
+MODEL_DEVICE = None
+
+# Auto mode (no language given): evaluate models in this order and stop at the first confident one
+AUTO_MODE_CASCADE_ENABLED = True
+AUTO_MODE_LANGUAGE_ORDER = ("ENGLISH", "KOREAN", "JAPANESE", "CHINESE_SIM", "CHINESE_TRA")
+
+# Confidence (0-100) a model has to reach to stop the cascade
+AUTO_MODE_CONFIDENCE_THRESHOLD = 90.0
+
+# Languages able to recognize each script, in order of preference
+SCRIPT_LANGUAGES = {
+    "Latin": ("ENGLISH",),
+    "Hangul": ("KOREAN",),
+    "Kana": ("JAPANESE",),
+    "Han": ("CHINESE_SIM", "CHINESE_TRA", "JAPANESE"),
+}
+
+# Script routing of auto mode requests to the most likely languages, from the letters of a quick Tesseract pass
+# (enable it once python -m benchmarks.check_script_routing passes on representative images)
+SCRIPT_ROUTING_ENABLED = False
+SCRIPT_ROUTER_MAX_MODELS = 2
+
+# Tesseract languages of the script pass (their language data has to be installed) and width of its image
+SCRIPT_OCR_LANGUAGES = "eng+kor+jpn+chi_sim"
+SCRIPT_OCR_MAX_WIDTH = 1000
+
+# Minimum number of letters the script pass has to recognize to route a request (the cascade decides otherwise)
+SCRIPT_MIN_CHARACTERS = 5
+
+# Handwriting classifier, loaded once per process (classifier files are .safetensors, or pickled .tgc files)
+HANDWRITING_CLASSIFIER_MODEL_PATH = os.path.join('ocrd_typegroups_classifier', 'models', 'classifier.safetensors')
+
+# Classify the handwriting patches from one feature map of the whole image (faster, scores close to the patch-wise ones)
+HANDWRITING_CLASSIFIER_FULLY_CONVOLUTIONAL = False
+
+# Only classify the handwriting patches holding at least this share of ink pixels (None classifies every patch)
+HANDWRITING_MIN_INK_DENSITY = 0.002
+
+# Maximum number of patches classified per image (at least 1), spread over the page (None for every patch holding ink)
+HANDWRITING_MAX_PATCHES = None
+
+# Minimum time between two checks of the classifier files for hot reload (None disables the reload)
+CLASSIFIER_RELOAD_CHECK_SECONDS = 10
+
+# Execution of the auto mode language models when several of them run: "sequential" or "thread"
+MODEL_EXECUTION_MODE = "sequential"
+MODEL_EXECUTOR_WORKERS = 5
+
+# Intra-op threads of the formula recognition (ONNX Runtime) sessions (None splits the CPU cores between the model
+# workers in "thread" execution mode, and keeps the runtime's default in "sequential" mode)
+MODEL_INTRA_OP_THREADS = None
+
+# Micro-batching of the formula recognition (MFR) across concurrent requests
+MFR_BATCHING_ENABLED = True
+MFR_MAX_BATCH_SIZE = 32
+MFR_MAX_WAIT_MS = 10
+
+# Keep a copy of every received image in DOWNLOADED_IMAGE_PATH (images are otherwise processed in memory only)
+SAVE_DOWNLOADED_IMAGES = False
+
+# Image download (timeouts in seconds)
+DOWNLOAD_CONNECT_TIMEOUT = 3.05
+DOWNLOAD_READ_TIMEOUT = 10
+DOWNLOAD_TOTAL_TIMEOUT = 30
+DOWNLOAD_MAX_BYTES = 20 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Connection pools kept alive by the download session (number of hosts and connections per host)
+DOWNLOAD_POOL_CONNECTIONS = 16
+DOWNLOAD_POOL_MAXSIZE = 16
+
+# Result cache keyed by image content and request options
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MAX_ENTRIES = 1024
+RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Optional on-disk SQLite tier of the result cache (None to disable)
+RESULT_CACHE_SQLITE_PATH = None
+RESULT_CACHE_SQLITE_MAX_ENTRIES = 100000
+
+# Share the work of identical requests in flight at the same time (same image URL or content and options)
+SINGLE_FLIGHT_ENABLED = True
+
+# Batch conversion: maximum number of images per batch and workers of each pipeline stage
+BATCH_MAX_ITEMS = 100
+BATCH_DOWNLOAD_WORKERS = 16
+BATCH_DECODE_WORKERS = 4
+BATCH_INFERENCE_WORKERS = 4
+
+# Streamed batch conversion: maximum number of images in flight (started but not yet sent to the client)
+BATCH_STREAM_WINDOW = 8
+
+# Async (aiohttp) entry point: connections of the download session and workers of the CPU-bound stages
+ASYNC_DOWNLOAD_CONNECTIONS = 100
+ASYNC_DECODE_WORKERS = 4
+ASYNC_INFERENCE_WORKERS = 4
+
+# Per-request profiling, requested with the X-Profile header or the profile query parameter ("cprofile" or
+# "sampling") and, if PROFILING_TOKEN is set, the same token in the X-Profile-Token header
+PROFILING_ENABLED = False
+PROFILING_TOKEN = None
+PROFILING_OUTPUT_PATH = os.path.join('profiles')
+PROFILING_SAMPLING_INTERVAL_MS = 5
+
+# Allow requests to add a torch profiler trace of the model stages (X-Profile-Torch header or profile_torch=1)
+PROFILING_TORCH_TRACE_ENABLED = False
+
+# Admission control: requests processed at once per worker process, requests allowed to wait for a slot beyond
+# them, and how long they may wait; requests above the queue are rejected at once with HTTP 503 and Retry-After.
+# Run uWSGI with at least ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUED threads so that the queue is ours.
+ADMISSION_CONTROL_ENABLED = True
+ADMISSION_MAX_CONCURRENT = 4
+ADMISSION_MAX_QUEUED = 16
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 30
+ADMISSION_RETRY_AFTER_SECONDS = 2
+
+# Concurrent calls allowed per language model (MODEL_DEFAULT_MAX_CONCURRENCY for the unlisted ones, None for
+# unlimited) and concurrent auto mode requests (None for unlimited), so that auto mode requests running every
+# model can't starve the single-language ones
+MODEL_MAX_CONCURRENCY = {"ENGLISH": 4}
+MODEL_DEFAULT_MAX_CONCURRENCY = 2
+AUTO_MODE_MAX_CONCURRENT = 2
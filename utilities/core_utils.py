@@ -3,16 +3,20 @@ Title: Core utils
 Author: Trojan
 Date: 25-06-2024
 """
-import os
+import re
 import uuid
 import json
 import logging
-from flask import jsonify
+from contextlib import nullcontext
 from super_image import EdsrModel
-from PIL import Image
 from data_extractors.advanced_text_extractor import AdvancedTextExtractor
 from data_extractors.asciimath_converter import AsciimathConverter
 from data_extractors.latex_extractor import LatexExtractor
+from utilities.general_utils import save_image_bytes
+from utilities.http_client import check_url_and_download_image
+from utilities.image_context import ImageContext
+from utilities.metrics import timed
+from utilities.result_cache import ResultCache, uncached_reasons
 
 # Constants for repeated keys
 LATEX = "latex"
@@ -32,49 +36,162 @@ def parse_request_data(request):
     return json.loads(json_string, strict=False)
 
 
-def extract_data_from_image(downloaded_file_path, app, request_id):
+def extract_data_from_image(image_context, app, context):
     """Extract data from the downloaded image based on the language."""
-    if app.language:
-        latex_extractor = LatexExtractor(downloaded_file_path)
+    request_id = context.request_id
+    if context.options.language:
+        latex_extractor = LatexExtractor(image_context, model_registry=app.model_registry)
         return latex_extractor.recognize_image_single_language(
-            model=app.language_dictionary[app.language], request_id=request_id
-        )
+            model=app.model_registry.get(context.options.language), request_id=request_id,
+            language=context.options.language
+        ) + (None,)
     else:
         latex_extractor = LatexExtractor(
-            downloaded_file_path=downloaded_file_path,
-            latex_model_english=app.latex_model_english,
-            latex_model_korean=app.latex_model_korean,
-            latex_model_japanese=app.latex_model_japanese,
-            latex_model_chinese_sim=app.latex_model_chinese_sim,
-            latex_model_chinese_tra=app.latex_model_chinese_tra
+            image_context=image_context,
+            model_registry=app.model_registry,
+            script_classifier=app.script_classifier
         )
-        return latex_extractor.recognize_image(request_id=request_id)
+        # Auto mode runs several models, only a few such requests may run at once
+        with app.auto_mode_slots or nullcontext():
+            return latex_extractor.recognize_image(request_id=request_id)
 
 
-def convert_to_ascii(latex_styled_result, app, request_id):
+def convert_to_ascii(latex_styled_result, app, context):
     """Convert latex to ASCII format."""
     ascii_converter = AsciimathConverter(converter_model=app.tex2asciimath)
-    return ascii_converter.convert_to_ascii(request_id=request_id, latex_expression=latex_styled_result)
+    with timed("convert_to_ascii"):
+        return ascii_converter.convert_to_ascii(request_id=context.request_id, latex_expression=latex_styled_result)
 
 
-def advanced_text_extraction(app, downloaded_file_path, request_id):
+def advanced_text_extraction(app, image_context, context):
     """Perform advanced text extraction if enabled."""
-    if app.advanced_text_extraction and app.language:
+    options = context.options
+    if options.advanced_text_extraction and options.language:
         model = EdsrModel.from_pretrained('eugenesiow/edsr-base', scale=4)
-        advanced_text_extractor = AdvancedTextExtractor(downloaded_file_path, language=app.language)
-        return advanced_text_extractor.extract_text(model, request_id)
+        advanced_text_extractor = AdvancedTextExtractor(image_context, language=options.language)
+        return advanced_text_extractor.extract_text(model, context.request_id)
     return None
 
 
-def construct_response(app, request_id, text_result, advanced_text_result, latex_styled_result, final_data_result,
-                       is_handwritten, is_diagram_available, latex_confidence, confidence_per_line):
+def process_url(app, context):
+    """
+    Download the image of the request and return its response.
+
+    Identical requests (same URL and options) in flight at the same time share a single download and pipeline run.
+    """
+    def download_and_process():
+        image_context = ImageContext(check_url_and_download_image(context, app))
+        sized_context = context.with_image_size(image_context.size)
+        try:
+            return process_image(image_context, app, sized_context)
+        except Exception as e:
+            # Keep the image size in the error response
+            e.context = sized_context
+            raise
+
+    if app.single_flight is None or context.profiling:
+        return download_and_process()
+
+    response_dict, shared = app.single_flight.do(url_flight_key(context), download_and_process)
+    if shared:
+        logging.info(f"Sharing the response of an identical in-flight request for REQUEST_ID: {context.request_id}")
+        return with_request_fields(response_dict, context)
+    return response_dict
+
+
+def url_flight_key(context):
+    """Single flight key of the requests for the same image URL and options, shared with the async routes."""
+    return "url", context.options.image_url, context.options.normalized()
+
+
+def process_image(image_context, app, context):
+    """
+    Return the response for the decoded image, from the result cache if the same image and options were seen.
+
+    Requests for the same image and options in flight at the same time share a single pipeline run.
+    """
+    if (app.result_cache is None and app.single_flight is None) or context.profiling:
+        return run_pipeline(image_context, app, context)
+
+    cache_key = ResultCache.make_key(image_context.image_bytes, context.options)
+    if app.result_cache is not None:
+        cached_response = app.result_cache.get(cache_key)
+        if cached_response is not None:
+            logging.info(f"Result cache hit for REQUEST_ID: {context.request_id}")
+            return with_request_fields(cached_response, context)
+
+    def run_and_store():
+        with uncached_reasons() as reasons:
+            response_dict = run_pipeline(image_context, app, context)
+        if reasons:
+            logging.info(f"Result not cached for REQUEST_ID: {context.request_id}: {', '.join(reasons)}")
+        elif app.result_cache is not None:
+            app.result_cache.put(cache_key, response_dict)
+        return response_dict
+
+    if app.single_flight is None:
+        return run_and_store()
+
+    response_dict, shared = app.single_flight.do(("image", cache_key), run_and_store)
+    if shared:
+        logging.info(f"Sharing the response of an identical in-flight request for REQUEST_ID: {context.request_id}")
+        return with_request_fields(response_dict, context)
+    return response_dict
+
+
+def with_request_fields(response_dict, context):
+    """Copy a response computed for another request, replacing the fields specific to this request."""
+    response_dict = dict(response_dict, request_id=context.request_id)
+    if "url" in response_dict:
+        response_dict["url"] = context.options.image_url
+    return response_dict
+
+
+def run_pipeline(image_context, app, context):
+    """Run the extraction pipeline on the decoded image and return the response dictionary."""
+    (latex_styled_result, latex_confidence, is_handwritten, is_diagram_available,
+     confidence_per_line, language_selection) = extract_data_from_image(image_context, app, context)
+
+    data_ascii_result, text_result = convert_to_ascii(latex_styled_result, app, context)
+
+    advanced_text_result = advanced_text_extraction(app, image_context, context)
+
+    if advanced_text_result is not None:
+        if len(advanced_text_result) <= len(text_result) // 2:
+            advanced_text_result = text_result
+    else:
+        advanced_text_result = ""
+
+    if not text_result.strip():
+        text_result = "".join([item["value"] for item in data_ascii_result if item["type"] == "asciimath"])
+
+    latex_styled_result = re.sub(r'\\{2,}', r'\\', latex_styled_result)
+
+    final_data_result = []
+    if context.options.include_text:
+        final_data_result.append({"type": TEXT, "value": text_result})
+    if context.options.include_asciimath:
+        final_data_result += data_ascii_result
+    if context.options.include_latex:
+        final_data_result.append({"type": LATEX, "value": latex_styled_result})
+
+    return construct_response(
+        app, context, text_result, advanced_text_result, latex_styled_result, final_data_result,
+        is_handwritten, is_diagram_available, latex_confidence, confidence_per_line, language_selection
+    )
+
+
+def construct_response(app, context, text_result, advanced_text_result, latex_styled_result, final_data_result,
+                       is_handwritten, is_diagram_available, latex_confidence, confidence_per_line,
+                       language_selection=None):
     """Construct the appropriate response based on the requested formats."""
+    options = context.options
     response_dict = {
         "status": 1,
-        "request_id": request_id,
+        "request_id": context.request_id,
         "version": app.api_version,
-        "image_width": app.image_width,
-        "image_height": app.image_height,
+        "image_width": context.image_width,
+        "image_height": context.image_height,
         "is_printed": not is_handwritten,
         "is_handwritten": is_handwritten,
         "is_diagram_available": is_diagram_available,
@@ -82,22 +199,25 @@ def construct_response(app, request_id, text_result, advanced_text_result, latex
         "latex_styled": latex_styled_result,
         "confidence": latex_confidence,
         "confidence_per_line": confidence_per_line,
-        "url": app.image_url
+        "url": options.image_url
     }
 
-    if app.advanced_text_extraction:
+    if language_selection is not None:
+        response_dict["language_selection"] = language_selection
+
+    if options.advanced_text_extraction:
         response_dict["advanced_text"] = {"type": "text", "value": advanced_text_result}
 
-    if "text" in app.formats and "data" in app.formats:
+    if "text" in options.formats and "data" in options.formats:
         response_dict["data"] = final_data_result
-    elif "data" in app.formats and "text" not in app.formats:
+    elif "data" in options.formats and "text" not in options.formats:
         response_dict = {key: response_dict[key] for key in response_dict if
                          key not in ["text", "advanced_text", "latex_styled"]}
         response_dict["data"] = final_data_result
-    elif "text" in app.formats and "data" not in app.formats:
+    elif "text" in options.formats and "data" not in options.formats:
         response_dict = {key: response_dict[key] for key in response_dict if key not in ["data"]}
 
-    return jsonify(response_dict)
+    return response_dict
 
 
 def validate_file(request, request_id):
@@ -116,17 +236,18 @@ def validate_file(request, request_id):
     return True, file
 
 
-def save_file(file, request_id, app):
-    """Save the uploaded file and return the file path."""
-    file_path = os.path.join(app.downloaded_file_path, f"{request_id}.png")
-    file.save(file_path)
-    return file_path
+def read_file(file, request_id, app):
+    """Read and decode the uploaded file."""
+    image_bytes = file.read()
+    save_image_bytes(image_bytes, request_id, app)
+    return ImageContext(image_bytes)
 
 
-def extract_image_size(file_path):
-    """Extract image dimensions."""
-    with Image.open(file_path) as img:
-        return img.size
+def is_streaming_requested(request):
+    """Check if the client asked for a streamed (NDJSON) response, with ?stream=true or the Accept header."""
+    if request.args.get("stream", "false").lower() in ("1", "true", "yes"):
+        return True
+    return "application/x-ndjson" in request.headers.get("Accept", "")
 
 
 def parse_form_data(request):
@@ -0,0 +1,75 @@
+"""
+Title: HTTP client
+Author: Trojan
+Date: 17-10-2026
+"""
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utilities.config import DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT, DOWNLOAD_TOTAL_TIMEOUT, \
+    DOWNLOAD_MAX_BYTES, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_POOL_CONNECTIONS, DOWNLOAD_POOL_MAXSIZE
+from utilities.custom_exception import CustomExceptionAndLog
+from utilities.general_utils import save_image_bytes
+from utilities.metrics import timed
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session keeping connections alive per host."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_POOL_CONNECTIONS, pool_maxsize=DOWNLOAD_POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def download_image_bytes(image_url: str) -> bytes:
+    """
+    Stream an image into memory, enforcing the connect/read timeouts, the total download time and the size cap.
+    """
+    start_time = time.monotonic()
+    with timed("download"), \
+            get_session().get(image_url, stream=True, timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)) as response:
+        response.raise_for_status()
+
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > DOWNLOAD_MAX_BYTES:
+            raise CustomExceptionAndLog("E_OCR_021", f"Image exceeds the maximum size of {DOWNLOAD_MAX_BYTES} bytes")
+
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > DOWNLOAD_MAX_BYTES:
+                raise CustomExceptionAndLog("E_OCR_021", f"Image exceeds the maximum size of {DOWNLOAD_MAX_BYTES} bytes")
+            if time.monotonic() - start_time > DOWNLOAD_TOTAL_TIMEOUT:
+                raise CustomExceptionAndLog("E_OCR_022", f"Image download exceeded {DOWNLOAD_TOTAL_TIMEOUT} seconds")
+        return bytes(buffer)
+
+
+def check_url_and_download_image(context, app) -> bytes:
+    """Download the image of the request, raising a CustomExceptionAndLog carrying the error code on failure."""
+    image_url = context.options.image_url
+    parsed_url = urlparse(image_url)
+    if not (parsed_url.scheme and parsed_url.netloc):
+        raise CustomExceptionAndLog("E_OCR_011", "Invalid URL format")
+
+    try:
+        image_bytes = download_image_bytes(image_url)
+    except CustomExceptionAndLog:
+        raise
+    except Exception as e:
+        raise CustomExceptionAndLog("E_OCR_010", f"Error with exception: {str(e)}") from e
+
+    save_image_bytes(image_bytes, context.request_id, app)
+    return image_bytes
@@ -0,0 +1,89 @@
+"""
+Title: Image context
+Author: Trojan
+Date: 17-10-2026
+"""
+import threading
+from io import BytesIO
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from utilities.custom_exception import CustomExceptionAndLog
+from utilities.metrics import timed
+
+
+class ImageContext:
+    """
+    Image of a request, decoded once and shared by every stage of the pipeline.
+
+    The views needed by the stages (PIL RGB, BGR and grayscale arrays, downscaled copies) are derived lazily
+    and cached. When a stage modifies the image (e.g. diagram masking), it replaces the pixels through
+    ``replace_bgr`` and the cached views are derived again from the new pixels.
+    """
+
+    def __init__(self, image_bytes: bytes):
+        """
+        :param image_bytes: Encoded image (PNG, JPEG, ...) as received from the client or the image host.
+        """
+        self.image_bytes = image_bytes
+        try:
+            with timed("decode"):
+                image = Image.open(BytesIO(image_bytes))
+                image.load()
+                image_format = image.format
+                # Phone photos are stored sideways with an EXIF orientation tag: every view is built upright
+                image = ImageOps.exif_transpose(image)
+        except Exception as e:
+            raise CustomExceptionAndLog("E_OCR_020", f"Image decoding failed with error: {str(e)}")
+
+        self.format: Optional[str] = image_format
+        self._image = image
+        self._views = {}
+        self._lock = threading.RLock()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height) of the image, once oriented by its EXIF tag."""
+        return self._image.size
+
+    @property
+    def rgb(self) -> Image.Image:
+        """PIL image in RGB mode."""
+        return self._view("rgb", lambda: self._image.convert('RGB'))
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """Array in OpenCV's BGR channel order."""
+        return self._view("bgr", lambda: cv2.cvtColor(np.asarray(self.rgb), cv2.COLOR_RGB2BGR))
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Grayscale array."""
+        return self._view("gray", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    def downscaled(self, max_width: int) -> Image.Image:
+        """
+        RGB image resized to max_width (keeping the aspect ratio) if it is wider, the RGB image otherwise.
+        """
+        width, height = self.size
+        if width <= max_width:
+            return self.rgb
+        return self._view(
+            ("downscaled", max_width),
+            lambda: self.rgb.resize((max_width, round(height * float(max_width) / width)), Image.BILINEAR)
+        )
+
+    def replace_bgr(self, bgr_image: np.ndarray):
+        """Replace the pixels of the image by a BGR array, dropping every cached view."""
+        with self._lock:
+            self._image = Image.fromarray(cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB))
+            self._views = {"bgr": bgr_image}
+
+    def _view(self, key, build):
+        with self._lock:
+            if key not in self._views:
+                self._views[key] = build()
+            return self._views[key]
@@ -0,0 +1,209 @@
+"""
+Title: Metrics
+Author: Trojan
+Date: 17-10-2026
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds), from a cached stage to a slow multi-model auto mode request
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """Base of the metrics: a name, a help text, label names and one value per combination of label values."""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self) -> List[str]:
+        """Return the lines of the metric in the Prometheus text format."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _ValueMetric(_Metric):
+    """
+    Metric holding one value per combination of label values. The values are either updated by the code, or read
+    from ``function`` at every collection; the function returns the value, or a list of (label values, value)
+    pairs for a labelled metric.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.function = function
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        if self.function is not None:
+            value = self.function()
+            values = [(tuple(map(str, key)), value) for key, value in value] if self.labelnames else [((), value)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values)]
+
+
+class Counter(_ValueMetric):
+    """Monotonically increasing count."""
+    metric_type = "counter"
+
+
+class Gauge(_ValueMetric):
+    """Value going up and down."""
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """Increment the gauge for the duration of the block."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (durations) in cumulative buckets."""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, (('le', _format_value(bound)),))}"
+                             f" {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics exposed on /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric, replacing the metric of the same name (e.g. registered by a previous app instance)."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.collect()) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "formula_ocr_stage_duration_seconds", "Duration of the pipeline stages.", ("stage", "language")
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "formula_ocr_request_duration_seconds", "Duration of the requests.", ("endpoint",)
+))
+REQUESTS = REGISTRY.register(Counter(
+    "formula_ocr_requests_total", "Requests by endpoint and HTTP status.", ("endpoint", "status")
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "formula_ocr_requests_in_flight", "Requests being processed.", ("endpoint",)
+))
+STAGE_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "formula_ocr_stage_cache_lookups_total", "Lookups of the per-image stage cache by result.", ("result",)
+))
+
+HANDWRITING_PATCHES = REGISTRY.register(Counter(
+    "formula_ocr_handwriting_patches_total", "Patches of the handwriting detection classified or skipped.",
+    ("outcome",)
+))
+
+
+@contextmanager
+def timed(stage: str, language: str = ""):
+    """
+    Record the duration of the block in the stage duration histogram.
+
+    :param stage: Name of the stage (e.g. "download", "diagram_masking").
+    :param language: Language of the model for the per-language stages.
+    """
+    with STAGE_DURATION.time(stage=stage, language=language or ""):
+        yield
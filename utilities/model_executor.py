@@ -0,0 +1,54 @@
+"""
+Title: Model executor
+Author: Trojan
+Date: 17-10-2026
+"""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from utilities.config import LOGGING_LEVEL, MODEL_EXECUTION_MODE, MODEL_EXECUTOR_WORKERS, MODEL_INTRA_OP_THREADS
+from utilities.general_utils import setup_logging
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def intra_op_threads() -> Optional[int]:
+    """
+    Return the number of intra-op threads of each model session, None to keep the runtime's default.
+
+    In "thread" execution mode, the CPU cores are split between the model workers unless MODEL_INTRA_OP_THREADS
+    is set, so that the workers don't oversubscribe the CPU.
+    """
+    if MODEL_INTRA_OP_THREADS:
+        return MODEL_INTRA_OP_THREADS
+    if MODEL_EXECUTION_MODE == "thread":
+        return max((os.cpu_count() or 1) // MODEL_EXECUTOR_WORKERS, 1)
+    return None
+
+
+def get_model_executor() -> ThreadPoolExecutor:
+    """Return the process-wide thread pool running language models in parallel."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MODEL_EXECUTOR_WORKERS, thread_name_prefix="model")
+            logging.info(f"Model executor started with {MODEL_EXECUTOR_WORKERS} workers.")
+        return _executor
+
+
+def run_in_parallel(function: Callable[[Any], Any], items: Iterable[Any]) -> Dict[Any, Any]:
+    """
+    Call the function on every item using the model executor and return the results keyed by item, in input order.
+    The caller's context variables are visible to every call.
+    """
+    executor = get_model_executor()
+    futures = {item: executor.submit(contextvars.copy_context().run, function, item) for item in items}
+    return {item: future.result() for item, future in futures.items()}
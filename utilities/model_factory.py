@@ -0,0 +1,106 @@
+"""
+Title: Model factory
+Author: Trojan
+Date: 17-10-2026
+"""
+import logging
+import threading
+from typing import Optional
+
+import onnxruntime
+from pix2text import Pix2Text
+from pix2text.text_formula_ocr import TextFormulaOCR
+
+from utilities.batching import BatchedRecognizer
+from utilities.config import LOGGING_LEVEL, MFR_BATCHING_ENABLED, MFR_MAX_BATCH_SIZE, MFR_MAX_WAIT_MS
+from utilities.general_utils import setup_logging
+from utilities.model_executor import intra_op_threads
+from utilities.stage_cache import StageCachedModel
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+
+class SharedPix2TextFactory:
+    """
+    Builds per-language Pix2Text instances sharing their language-independent models.
+
+    The layout parser, the formula detector (MFD), the formula recognizer (MFR) and the table recognizer are
+    loaded once and handed to every language; only the text recognizer is built per language.
+    """
+
+    def __init__(self, device: Optional[str] = None):
+        """
+        :param device: Device used by every model, Pix2Text selects one if None.
+        """
+        self.device = device
+        self._shared_model: Optional[Pix2Text] = None
+        self._lock = threading.Lock()
+
+    def load_shared_models(self) -> Pix2Text:
+        """Load the language-independent models once and return the Pix2Text instance holding them."""
+        with self._lock:
+            if self._shared_model is None:
+                self._shared_model = Pix2Text.from_config(
+                    total_configs={'text_formula': text_formula_configs(('en',))}, device=self.device
+                )
+                enable_formula_batching(self._shared_model)
+                self._wrap_stage_models(self._shared_model.text_formula_ocr)
+                logging.info("Shared layout and formula models initialized.")
+            return self._shared_model
+
+    def build(self, language_code: tuple) -> Pix2Text:
+        """
+        Build a Pix2Text instance for the given text languages on top of the shared models.
+        """
+        shared_model = self.load_shared_models()
+        if tuple(language_code) == ('en',):
+            return shared_model
+
+        shared_text_formula_ocr = shared_model.text_formula_ocr
+        # Formula models are disabled here so that only the text recognizer is loaded.
+        language_text_formula_ocr = TextFormulaOCR.from_config(
+            {'languages': tuple(language_code)}, enable_formula=False, device=self.device
+        )
+        text_formula_ocr = TextFormulaOCR(
+            text_ocr=language_text_formula_ocr.text_ocr,
+            mfd=shared_text_formula_ocr.mfd,
+            latex_ocr=shared_text_formula_ocr.latex_ocr,
+            spellchecker=language_text_formula_ocr.spellchecker,
+            enable_formula=True
+        )
+        return Pix2Text(
+            layout_parser=shared_model.layout_parser,
+            text_formula_ocr=text_formula_ocr,
+            table_ocr=shared_model.table_ocr
+        )
+
+    @staticmethod
+    def _wrap_stage_models(text_formula_ocr: TextFormulaOCR):
+        """Let the shared formula models reuse their results across languages for the same image."""
+        if text_formula_ocr.mfd is not None:
+            text_formula_ocr.mfd = StageCachedModel(text_formula_ocr.mfd, "mfd")
+        if text_formula_ocr.latex_ocr is not None:
+            text_formula_ocr.latex_ocr = StageCachedModel(text_formula_ocr.latex_ocr, "mfr")
+
+
+def text_formula_configs(language_code: tuple) -> dict:
+    """
+    Pix2Text text_formula configuration of the given text languages, giving the formula recognition (MFR) session
+    its share of the CPU cores (see intra_op_threads).
+    """
+    configs = {'languages': tuple(language_code)}
+    threads = intra_op_threads()
+    if threads:
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        configs['formula'] = {'more_model_configs': {'session_options': session_options}}
+    return configs
+
+
+def enable_formula_batching(model: Pix2Text) -> Pix2Text:
+    """Send the formula recognition calls of a Pix2Text instance through a cross-request micro-batcher."""
+    text_formula_ocr = model.text_formula_ocr
+    if MFR_BATCHING_ENABLED and text_formula_ocr.latex_ocr is not None:
+        text_formula_ocr.latex_ocr = BatchedRecognizer(text_formula_ocr.latex_ocr, MFR_MAX_BATCH_SIZE, MFR_MAX_WAIT_MS)
+    return model
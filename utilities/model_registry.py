@@ -0,0 +1,216 @@
+"""
+Title: Model registry
+Author: Trojan
+Date: 17-10-2026
+"""
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict, Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import psutil
+import torch
+
+from utilities.config import LOGGING_LEVEL
+from utilities.custom_exception import CustomExceptionAndLog
+from utilities.general_utils import setup_logging
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+
+class ModelRegistry:
+    """
+    Loads language models on first use and keeps a bounded number of them resident.
+
+    Models are evicted in least-recently-used order once more than ``max_resident`` models are loaded
+    or once the estimated footprint of the resident models exceeds ``memory_budget_mb``. The footprint of a model
+    is the growth of the RSS and of the CUDA memory allocated by torch while it loads; loads are serialized so
+    that they don't skew each other's measure. Every load and eviction is logged, kept in ``events`` and
+    forwarded to the registered listeners.
+
+    The number of concurrent calls to each model can be limited with ``model_slot``, so that requests running
+    many models (auto mode) can't monopolize a model needed by other requests.
+    """
+
+    def __init__(self, loaders: Dict[str, Callable[[], Any]], max_resident: Optional[int] = None,
+                 memory_budget_mb: Optional[float] = None, max_events: int = 100,
+                 max_concurrency: Optional[Dict[str, int]] = None, default_max_concurrency: Optional[int] = None):
+        """
+        :param loaders: Maps a language key (e.g. "ENGLISH") to a callable building its model.
+        :param max_resident: Maximum number of models kept in memory, unlimited if None.
+        :param memory_budget_mb: Memory budget for the resident models in MB, unlimited if None.
+        :param max_events: Number of load/evict events kept in ``events``.
+        :param max_concurrency: Maximum number of concurrent calls per language model.
+        :param default_max_concurrency: Maximum number of concurrent calls of the other models, unlimited if None.
+        """
+        self._loaders = dict(loaders)
+        self.max_resident = max_resident
+        self.memory_budget_mb = memory_budget_mb
+
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._footprints_mb: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._load_locks = {language: threading.Lock() for language in self._loaders}
+        self._measure_lock = threading.Lock()
+        self._listeners: List[Callable[[dict], None]] = []
+
+        self.events = deque(maxlen=max_events)
+        self.stats = Counter()
+
+        max_concurrency = max_concurrency or {}
+        self._slots = {}
+        for language in self._loaders:
+            limit = max_concurrency.get(language, default_max_concurrency)
+            if limit:
+                self._slots[language] = threading.BoundedSemaphore(limit)
+        self.slots_in_use = Counter()
+
+    def __contains__(self, language: str) -> bool:
+        return language in self._loaders
+
+    def languages(self) -> List[str]:
+        """Return every language key the registry can load."""
+        return list(self._loaders)
+
+    def resident_languages(self) -> List[str]:
+        """Return the loaded language keys, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    @contextmanager
+    def model_slot(self, language: str):
+        """
+        Hold one of the concurrency slots of the language's model for the duration of the block, waiting for
+        a slot to be released if they are all taken.
+        """
+        semaphore = self._slots.get(language)
+        if semaphore is None:
+            yield
+            return
+
+        if not semaphore.acquire(blocking=False):
+            self.stats["slot_waits"] += 1
+            semaphore.acquire()
+        with self._lock:
+            self.slots_in_use[language] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.slots_in_use[language] -= 1
+            semaphore.release()
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Register a callable receiving every load/evict event as a dictionary."""
+        self._listeners.append(listener)
+
+    def get(self, language: str) -> Any:
+        """
+        Return the model for the given language, loading it if it is not resident.
+        """
+        if language not in self._loaders:
+            raise CustomExceptionAndLog("E_OCR_018", f"Unsupported language: {language}")
+
+        with self._lock:
+            if language in self._models:
+                self._models.move_to_end(language)
+                self.stats["hits"] += 1
+                return self._models[language]
+
+        # Only one thread loads a given model, the others wait for it.
+        with self._load_locks[language]:
+            with self._lock:
+                if language in self._models:
+                    self._models.move_to_end(language)
+                    self.stats["hits"] += 1
+                    return self._models[language]
+            model = self._load(language)
+            with self._lock:
+                self._models[language] = model
+                self._evict_if_needed(keep=language)
+            return model
+
+    def preload(self, languages: Iterable[str]):
+        """Load the given languages ahead of the first request."""
+        for language in languages:
+            self.get(language)
+
+    def evict(self, language: str) -> bool:
+        """Drop a resident model, returning whether it was loaded."""
+        with self._lock:
+            if language not in self._models:
+                return False
+            self._remove(language, reason="manual")
+        gc.collect()
+        return True
+
+    def _load(self, language: str) -> Any:
+        with self._measure_lock:
+            use_cuda = torch.cuda.is_available()
+            if use_cuda:
+                torch.cuda.synchronize()
+                cuda_before = torch.cuda.memory_allocated()
+                torch.cuda.reset_peak_memory_stats()
+            rss_before = self._rss_mb()
+            start_time = time.perf_counter()
+            try:
+                model = self._loaders[language]()
+            except Exception as e:
+                raise CustomExceptionAndLog("E_OCR_019", f"Loading model for {language} failed with error: {str(e)}")
+            load_seconds = time.perf_counter() - start_time
+            rss_mb = max(self._rss_mb() - rss_before, 0.0)
+
+            cuda_mb = cuda_peak_mb = 0.0
+            if use_cuda:
+                torch.cuda.synchronize()
+                cuda_mb = max(torch.cuda.memory_allocated() - cuda_before, 0) / (1024 * 1024)
+                cuda_peak_mb = max(torch.cuda.max_memory_allocated() - cuda_before, 0) / (1024 * 1024)
+
+        footprint_mb = rss_mb + cuda_mb
+        self._footprints_mb[language] = footprint_mb
+        self.stats["loads"] += 1
+        self._record_event("load", language, load_seconds=round(load_seconds, 3),
+                           footprint_mb=round(footprint_mb, 1), rss_mb=round(rss_mb, 1), cuda_mb=round(cuda_mb, 1),
+                           cuda_peak_mb=round(cuda_peak_mb, 1))
+        return model
+
+    def _evict_if_needed(self, keep: str):
+        evicted = False
+        while len(self._models) > 1:
+            over_count = self.max_resident is not None and len(self._models) > self.max_resident
+            over_budget = self.memory_budget_mb is not None and self._resident_mb() > self.memory_budget_mb
+            if not (over_count or over_budget):
+                break
+            victim = next(language for language in self._models if language != keep)
+            self._remove(victim, reason="max_resident" if over_count else "memory_budget")
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def _remove(self, language: str, reason: str):
+        # Requests still holding the model keep their reference until they finish.
+        del self._models[language]
+        self.stats["evictions"] += 1
+        self._record_event("evict", language, reason=reason,
+                           footprint_mb=round(self._footprints_mb.get(language, 0.0), 1))
+
+    def _resident_mb(self) -> float:
+        return sum(self._footprints_mb.get(language, 0.0) for language in self._models)
+
+    def _record_event(self, event: str, language: str, **details):
+        event_dict = {"event": event, "language": language, "time": time.time(), **details}
+        self.events.append(event_dict)
+        logging.info(f"Model registry {event}: {event_dict}")
+        for listener in self._listeners:
+            try:
+                listener(event_dict)
+            except Exception as e:
+                logging.warning(f"Model registry listener failed with error: {str(e)}")
+
+    @staticmethod
+    def _rss_mb() -> float:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
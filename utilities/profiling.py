@@ -0,0 +1,205 @@
+"""
+Title: Profiling
+Author: Trojan
+Date: 17-10-2026
+"""
+import cProfile
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from utilities.config import LOGGING_LEVEL, PROFILING_ENABLED, PROFILING_TOKEN, PROFILING_OUTPUT_PATH, \
+    PROFILING_SAMPLING_INTERVAL_MS, PROFILING_TORCH_TRACE_ENABLED
+from utilities.general_utils import setup_logging
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+PROFILER_MODES = ("cprofile", "sampling")
+
+# Profilers hook into the interpreter (and torch) process-wide, so only one request is profiled at a time
+_profiling_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ProfileSettings:
+    """Profiling requested for one request."""
+    mode: str
+    torch_trace: bool = False
+
+
+def requested_profile(headers: Mapping[str, str], args: Mapping[str, str]) -> Optional[ProfileSettings]:
+    """
+    Return the profiling requested by the headers or the query parameters, or None if none was requested or
+    profiling is not allowed.
+    """
+    mode = (headers.get("X-Profile") or args.get("profile") or "").lower()
+    if not mode:
+        return None
+    if not PROFILING_ENABLED:
+        logging.warning("Profiling requested but disabled by PROFILING_ENABLED.")
+        return None
+    if PROFILING_TOKEN and not hmac.compare_digest(headers.get("X-Profile-Token", ""), PROFILING_TOKEN):
+        logging.warning("Profiling requested with an invalid token.")
+        return None
+    if mode not in PROFILER_MODES:
+        logging.warning(f"Unknown profiler mode: {mode}")
+        return None
+
+    torch_flag = headers.get("X-Profile-Torch") or args.get("profile_torch") or ""
+    return ProfileSettings(mode=mode, torch_trace=PROFILING_TORCH_TRACE_ENABLED
+                           and torch_flag.lower() in ("1", "true", "yes"))
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a single thread at a fixed interval and exports the samples in the speedscope format.
+    Only the profiled thread is inspected, the other threads of the process are not slowed down.
+    """
+
+    def __init__(self, thread_id: int, interval_ms: float = PROFILING_SAMPLING_INTERVAL_MS):
+        """
+        :param thread_id: Identifier of the thread to sample (threading.get_ident()).
+        :param interval_ms: Time between two samples.
+        """
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000.0
+        self.frames: List[dict] = []
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._frame_indexes: Dict[Tuple[str, str, int], int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        last_time = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_index(frame))
+                    frame = frame.f_back
+                self.samples.append(stack[::-1])
+                self.weights.append(now - last_time)
+            last_time = now
+
+    def _frame_index(self, frame) -> int:
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_indexes.get(key)
+        if index is None:
+            index = self._frame_indexes[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def to_speedscope(self, name: str) -> dict:
+        """Return the samples as a speedscope file (https://www.speedscope.app/file-format-schema.json)."""
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "formula_ocr",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights
+            }]
+        }
+
+
+class RequestProfile:
+    """
+    Files written by the profiling of a request, named after its request_id once it is known. ``active`` tells
+    whether the request is actually profiled (False when another request held the profiler).
+    """
+
+    def __init__(self, settings: ProfileSettings):
+        self.settings = settings
+        self.active = False
+        self.request_id: Optional[str] = None
+        self.paths: List[str] = []
+
+
+@contextmanager
+def profile_request(settings: ProfileSettings, output_path: str = PROFILING_OUTPUT_PATH):
+    """
+    Profile the block (run by the calling thread) and write the profiles to output_path when it ends.
+
+    The request_id attribute of the yielded RequestProfile has to be set inside the block. If another request
+    is being profiled, the block runs without profiling. Work sent to other threads (model executor,
+    micro-batcher) is only visible in the torch trace, which records every thread of the process.
+    """
+    profile = RequestProfile(settings)
+    if not _profiling_lock.acquire(blocking=False):
+        logging.warning("Profiling skipped: another request is being profiled.")
+        yield profile
+        return
+
+    profile.active = True
+    try:
+        with ExitStack() as stack:
+            if settings.mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                stack.callback(profiler.disable)
+            else:
+                profiler = SamplingProfiler(threading.get_ident())
+                profiler.start()
+                stack.callback(profiler.stop)
+
+            torch_profiler = None
+            if settings.torch_trace:
+                import torch
+                activities = [torch.profiler.ProfilerActivity.CPU]
+                if torch.cuda.is_available():
+                    activities.append(torch.profiler.ProfilerActivity.CUDA)
+                torch_profiler = stack.enter_context(torch.profiler.profile(activities=activities, record_shapes=True))
+
+            yield profile
+
+        _write_profiles(profile, profiler, torch_profiler, output_path)
+    finally:
+        _profiling_lock.release()
+
+
+def _write_profiles(profile: RequestProfile, profiler, torch_profiler, output_path: str):
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        name = profile.request_id or f"unknown-{int(time.time() * 1000)}"
+        if isinstance(profiler, SamplingProfiler):
+            path = os.path.join(output_path, f"{name}.speedscope.json")
+            with open(path, 'w') as f:
+                json.dump(profiler.to_speedscope(name), f)
+        else:
+            path = os.path.join(output_path, f"{name}.pstats")
+            profiler.dump_stats(path)
+        profile.paths.append(path)
+
+        if torch_profiler is not None:
+            path = os.path.join(output_path, f"{name}.torch.json")
+            torch_profiler.export_chrome_trace(path)
+            profile.paths.append(path)
+
+        logging.info(f"Profiles of REQUEST_ID {name} written to {profile.paths}")
+    except Exception as e:
+        logging.error(f"Writing the profiles failed with error: {str(e)}")
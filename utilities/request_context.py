@@ -0,0 +1,136 @@
+"""
+Title: Request context
+Author: Trojan
+Date: 17-10-2026
+"""
+import json
+from dataclasses import asdict, dataclass, field, replace
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class RequestOptions:
+    """
+    Immutable view of the options sent with a single conversion request.
+    """
+    # Image Source & Language
+    image_url: Optional[str] = None
+    language: Optional[str] = None
+
+    # Advanced Text Extraction
+    advanced_text_extraction: bool = False
+
+    # Formats (text and data)
+    formats: Tuple[str, ...] = ()
+
+    # Data Options
+    include_svg: bool = False
+    include_table_html: bool = False
+    include_latex: bool = False
+    include_tsv: bool = False
+    include_asciimath: bool = False
+    include_mathml: bool = False
+    include_text: bool = False
+
+    # Text Format Options (Latex styled)
+    text_math_delims: Tuple[str, ...] = ()
+    text_displaymath_delims: Tuple[str, ...] = ()
+    text_rm_spaces: bool = False
+    text_rm_newlines: bool = False
+    text_rm_fonts: bool = False
+    text_rm_style_syms: bool = False
+    text_rm_text: bool = False
+    text_long_frac: bool = False
+
+    # Data Format Options (Asciimath)
+    data_math_delims: Tuple[str, ...] = ()
+    data_displaymath_delims: Tuple[str, ...] = ()
+    data_rm_spaces: bool = False
+    data_rm_newlines: bool = False
+    data_rm_fonts: bool = False
+    data_rm_style_syms: bool = False
+    data_rm_text: bool = False
+    data_long_frac: bool = False
+
+    @classmethod
+    def from_request_data(cls, request_data: dict) -> "RequestOptions":
+        """
+        Build the options from the parsed JSON body or form data of a request.
+        """
+        data_options = request_data.get("data_options") or {}
+        format_options = request_data.get("format_options") or {}
+
+        text_format_options = format_options.get("text", {})
+        text_transforms = text_format_options.get("transforms", {})
+
+        data_format_options = format_options.get("data", {})
+        data_transforms = data_format_options.get("transforms", {})
+
+        # A single format may be sent as a bare string
+        formats = request_data.get("formats") or ()
+        if isinstance(formats, str):
+            formats = (formats,)
+
+        return cls(
+            image_url=request_data.get("src", None),
+            language=request_data.get("language", None),
+            advanced_text_extraction=request_data.get("advanced_text_extraction", False),
+            formats=tuple(formats),
+            include_svg=data_options.get("include_svg", False),
+            include_table_html=data_options.get("include_table_html", False),
+            include_latex=data_options.get("include_latex", False),
+            include_tsv=data_options.get("include_tsv", False),
+            include_asciimath=data_options.get("include_asciimath", False),
+            include_mathml=data_options.get("include_mathml", False),
+            include_text=data_options.get("include_text", False),
+            text_math_delims=tuple(text_format_options.get("math_delims", ())),
+            text_displaymath_delims=tuple(text_format_options.get("displaymath_delims", ())),
+            text_rm_spaces=text_transforms.get("rm_spaces", False),
+            text_rm_newlines=text_transforms.get("rm_newlines", False),
+            text_rm_fonts=text_transforms.get("rm_fonts", False),
+            text_rm_style_syms=text_transforms.get("rm_style_syms", False),
+            text_rm_text=text_transforms.get("rm_text", False),
+            text_long_frac=text_transforms.get("long_frac", False),
+            data_math_delims=tuple(data_format_options.get("math_delims", ())),
+            data_displaymath_delims=tuple(data_format_options.get("displaymath_delims", ())),
+            data_rm_spaces=data_transforms.get("rm_spaces", False),
+            data_rm_newlines=data_transforms.get("rm_newlines", False),
+            data_rm_fonts=data_transforms.get("rm_fonts", False),
+            data_rm_style_syms=data_transforms.get("rm_style_syms", False),
+            data_rm_text=data_transforms.get("rm_text", False),
+            data_long_frac=data_transforms.get("long_frac", False),
+        )
+
+    def normalized(self) -> str:
+        """
+        Canonical representation of the options affecting the result, i.e. all of them except the image source.
+        """
+        options = asdict(self)
+        options.pop("image_url", None)
+        return json.dumps(options, sort_keys=True)
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    """
+    Immutable per-request state threaded through the extraction pipeline.
+
+    The shared Flask app only holds models and configuration; everything that
+    belongs to a single request lives here, so concurrent requests in the same
+    process never see each other's values.
+    """
+    request_id: str
+    options: RequestOptions = field(default_factory=RequestOptions)
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+
+    # Profiled requests always run the pipeline (no result cache, no sharing with identical requests)
+    profiling: bool = False
+
+    def with_options(self, options: RequestOptions) -> "RequestContext":
+        """Return a copy of the context carrying the given request options."""
+        return replace(self, options=options)
+
+    def with_image_size(self, image_size: Tuple[int, int]) -> "RequestContext":
+        """Return a copy of the context carrying the given (width, height)."""
+        return replace(self, image_width=image_size[0], image_height=image_size[1])
@@ -0,0 +1,183 @@
+"""
+Title: Result cache
+Author: Trojan
+Date: 17-10-2026
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from utilities.config import LOGGING_LEVEL
+from utilities.general_utils import setup_logging
+
+# Logging Configuration
+setup_logging(LOGGING_LEVEL)
+
+_skip_reasons: ContextVar[Optional[List[str]]] = ContextVar("result_cache_skip_reasons", default=None)
+
+
+@contextmanager
+def uncached_reasons():
+    """Collect the reasons given by skip_caching while the block computes a result, which is cached if there is none."""
+    reasons = []
+    token = _skip_reasons.set(reasons)
+    try:
+        yield reasons
+    finally:
+        _skip_reasons.reset(token)
+
+
+def skip_caching(reason: str):
+    """Keep the result being computed out of the result cache, e.g. when a stage failed transiently."""
+    reasons = _skip_reasons.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of conversion responses.
+
+    Entries are keyed by the hash of the image bytes and the normalized request options. They live in an
+    in-memory LRU tier and, if ``sqlite_path`` is set, in an on-disk SQLite tier shared by the worker processes.
+    Both tiers expire entries after ``ttl_seconds`` and evict the least recently used ones above their size.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, sqlite_path: Optional[str] = None,
+                 sqlite_max_entries: int = 100000):
+        """
+        :param max_entries: Maximum number of entries in the in-memory tier.
+        :param ttl_seconds: Time to live of an entry.
+        :param sqlite_path: Path of the SQLite database, the on-disk tier is disabled if None.
+        :param sqlite_max_entries: Maximum number of entries in the on-disk tier.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_entries = sqlite_max_entries
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+
+        self.stats = Counter()
+
+    @staticmethod
+    def make_key(image_bytes: bytes, options) -> str:
+        """
+        Build the cache key of an image and its request options; the image source is not part of the key.
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(options.normalized().encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached response for the key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+        value = self._disk_get(key, now)
+        if value is not None:
+            self.stats["disk_hits"] += 1
+            self._memory_put(key, value, now)
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: dict):
+        """Store a response in every tier."""
+        now = time.time()
+        self._memory_put(key, value, now)
+        self._disk_put(key, value, now)
+        self.stats["stores"] += 1
+
+    def hit_rate(self) -> float:
+        """Share of lookups answered by the cache."""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+    def _memory_put(self, key: str, value: dict, now: float):
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _get_connection(self) -> Optional[sqlite3.Connection]:
+        if self.sqlite_path is None:
+            return None
+        # SQLite connections must not be shared across a fork.
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.sqlite_path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+            connection.commit()
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _disk_get(self, key: str, now: float) -> Optional[dict]:
+        try:
+            with self._lock:
+                connection = self._get_connection()
+                if connection is None:
+                    return None
+                row = connection.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if row[1] <= now:
+                    connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                    connection.commit()
+                    self.stats["expired"] += 1
+                    return None
+                connection.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                connection.commit()
+                return json.loads(row[0])
+        except Exception as e:
+            logging.warning(f"Result cache read failed with error: {str(e)}")
+            return None
+
+    def _disk_put(self, key: str, value: dict, now: float):
+        try:
+            with self._lock:
+                connection = self._get_connection()
+                if connection is None:
+                    return
+                connection.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + self.ttl_seconds, now)
+                )
+                connection.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+                connection.execute(
+                    "DELETE FROM results WHERE key IN ("
+                    "SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.sqlite_max_entries,)
+                )
+                connection.commit()
+        except Exception as e:
+            logging.warning(f"Result cache write failed with error: {str(e)}")
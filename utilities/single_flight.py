@@ -0,0 +1,99 @@
+"""
+Title: Single flight
+Author: Trojan
+Date: 17-10-2026
+"""
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    De-duplicates concurrent calls sharing the same key.
+
+    The first caller of a key runs the function; callers arriving while it runs wait for it and receive the
+    same result (or exception) instead of running the function again. The key is released as soon as the call
+    completes, so later callers run the function again (the result cache answers them if it is enabled).
+
+    Threads (``do``) and coroutines (``do_async``) share the same keys, so the Flask and async routes of a process
+    de-duplicate each other's calls.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of keys currently being computed."""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run the function once for all the concurrent callers of the key.
+
+        :param key: Key identifying identical calls.
+        :param function: Callable without arguments computing the result.
+        :return: The result and whether it was computed by another caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+
+        if not leader:
+            self.stats["shared"] += 1
+            return call.result(), True
+
+        self.stats["executed"] += 1
+        try:
+            result = function()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Same as ``do`` for a coroutine function, waiting for the running call without blocking the event loop.
+
+        :param key: Key identifying identical calls.
+        :param function: Coroutine function without arguments computing the result.
+        :return: The result and whether it was computed by another caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+
+        if not leader:
+            self.stats["shared"] += 1
+            # Shielded: a cancelled waiter must not cancel the call of the others
+            return await asyncio.shield(asyncio.wrap_future(call)), True
+
+        self.stats["executed"] += 1
+        try:
+            result = await function()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,131 @@
+"""
+Title: Stage cache
+Author: Trojan
+Date: 17-10-2026
+"""
+import copy
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+from utilities.metrics import STAGE_CACHE_LOOKUPS
+
+_active_scope: ContextVar[Optional["_StageScope"]] = ContextVar("shared_stage_scope", default=None)
+
+
+class _StageScope:
+    """Results of language-independent model calls made while processing one image."""
+
+    def __init__(self):
+        self._results = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return copy.deepcopy(self._results[key])
+            event = self._pending.get(key)
+            is_owner = event is None
+            if is_owner:
+                event = self._pending[key] = threading.Event()
+
+        if not is_owner:
+            # Another model is computing the same stage for this image, wait for its result.
+            event.wait()
+            with self._lock:
+                if key in self._results:
+                    self.hits += 1
+                    return copy.deepcopy(self._results[key])
+            return compute()
+
+        try:
+            result = compute()
+            with self._lock:
+                self._results[key] = copy.deepcopy(result)
+                self.misses += 1
+            return result
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            event.set()
+
+
+@contextmanager
+def shared_stage_scope():
+    """
+    Share the results of stage-cached models between every model call made inside the block.
+    """
+    scope = _StageScope()
+    token = _active_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _active_scope.reset(token)
+        STAGE_CACHE_LOOKUPS.inc(scope.hits, result="hit")
+        STAGE_CACHE_LOOKUPS.inc(scope.misses, result="miss")
+
+
+class StageCachedModel:
+    """
+    Proxy memoizing the calls to a language-independent model (formula detection or recognition).
+
+    Outside of a shared_stage_scope the calls go straight to the wrapped model. Inside a scope, a call
+    made with the same inputs as a previous one returns a copy of the previous result.
+    """
+
+    def __init__(self, model: Any, name: str):
+        self._model = model
+        self._name = name
+
+    def __getattr__(self, item):
+        return getattr(self._model, item)
+
+    def __call__(self, *args, **kwargs):
+        return self._cached_call("__call__", self._model, args, kwargs)
+
+    def detect(self, *args, **kwargs):
+        return self._cached_call("detect", self._model.detect, args, kwargs)
+
+    def recognize(self, *args, **kwargs):
+        return self._cached_call("recognize", self._model.recognize, args, kwargs)
+
+    def _cached_call(self, method_name: str, method: Callable, args: tuple, kwargs: dict):
+        scope = _active_scope.get()
+        if scope is None:
+            return method(*args, **kwargs)
+        fingerprint = _fingerprint((args, kwargs))
+        if fingerprint is None:
+            return method(*args, **kwargs)
+        return scope.get_or_compute((self._name, method_name, fingerprint), lambda: method(*args, **kwargs))
+
+
+def _fingerprint(value: Any) -> Optional[Any]:
+    """
+    Build a hashable fingerprint of model inputs, or None if one of them can't be fingerprinted.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, np.ndarray):
+        return "ndarray", value.shape, value.dtype.str, hashlib.blake2b(np.ascontiguousarray(value)).hexdigest()
+    if isinstance(value, Image.Image):
+        return "image", value.mode, value.size, hashlib.blake2b(value.tobytes()).hexdigest()
+    if isinstance(value, (list, tuple)):
+        items = tuple(_fingerprint(item) for item in value)
+        if any(item is None and original is not None for item, original in zip(items, value)):
+            return None
+        return type(value).__name__, items
+    if isinstance(value, dict):
+        items = tuple((key, _fingerprint(item)) for key, item in sorted(value.items(), key=lambda kv: str(kv[0])))
+        if any(item is None and value[key] is not None for key, item in items):
+            return None
+        return "dict", items
+    return None